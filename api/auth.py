@@ -1,45 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request, BackgroundTasks, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+import json
 import logging
 import httpx  # Added for token exchange
 
-from db.session import get_db
+from db.session import get_async_db, AsyncSessionLocal
 from models.user import User
 from schemas.user import UserResponse, TokenResponse, UserUpdate
+from crud.user import upsert_user, get_or_create_user
 from core.auth import create_access_token, create_refresh_token, verify_token, get_current_user
 from config.settings import settings
-
-# New imports for simplified Google token verification
-from google.oauth2 import id_token as google_id_token
-from google.auth.transport import requests as google_requests
+from utilities.http_client import get_http_client
+from utilities.oauth import verify_google_id_token, is_well_formed_google_token
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["authentication"])
 from pydantic import BaseModel, EmailStr
-from datetime import datetime, timedelta
 from utilities.smtp import send_email
-from jose import jwt
+from utilities.jwt import encode_token, decode_token
 
 MAGIC_LINK_EXPIRY_MINUTES = 15
 
+# Constant response bodies serialized once; a fresh Response is still built per request
+# because middleware (CORS) mutates response headers
+_MAGIC_LINK_SENT_BODY = json.dumps({"success": True, "message": "Magic link sent"}, separators=(",", ":")).encode()
+_LOGOUT_BODY = json.dumps({"success": True, "message": "Successfully logged out", "data": None}, separators=(",", ":")).encode()
+
 class RequestMagicLinkIn(BaseModel):
     email: EmailStr
 
 class VerifyMagicLinkIn(BaseModel):
     token: str
 
+class GoogleCredentialIn(BaseModel):
+    # Optional so a missing credential keeps returning 400 rather than a 422 validation error
+    credential: Optional[str] = None
+
 def create_magic_link_token(email: str) -> str:
     payload = {
         "email": email,
-        "exp": datetime.utcnow() + timedelta(minutes=MAGIC_LINK_EXPIRY_MINUTES),
         "type": "magic_link"
     }
-    return jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    return encode_token(payload, MAGIC_LINK_EXPIRY_MINUTES * 60)
 
 def verify_magic_link_token(token: str) -> str:
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+        payload = decode_token(token)
         if payload.get("type") != "magic_link":
             raise HTTPException(status_code=400, detail="Invalid token type")
         return payload["email"]
@@ -47,7 +54,11 @@ def verify_magic_link_token(token: str) -> str:
         raise HTTPException(status_code=400, detail="Invalid or expired link")
 
 @router.post("/request-link")
-async def request_magic_link(data: RequestMagicLinkIn, db: Session = Depends(get_db)):
+async def request_magic_link(
+    data: RequestMagicLinkIn,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_async_db)
+):
     """Send magic login link to email"""
     token = create_magic_link_token(data.email)
     link = f"{settings.FRONTEND_URL.rstrip('/')}/login?token={token}"
@@ -56,77 +67,70 @@ async def request_magic_link(data: RequestMagicLinkIn, db: Session = Depends(get
     <p><a href="{link}">{link}</a></p>
     <p>This link expires in {MAGIC_LINK_EXPIRY_MINUTES} minutes.</p>
     """
-    # Ensure user exists or create basic record
-    user = db.query(User).filter(User.email == data.email).first()
-    if not user:
-        user = User(name=data.email.split('@')[0], email=data.email, google_id=f"magic_{data.email}", role="user")
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    if not send_email(data.email, "Your Magic Login Link", html):
-        raise HTTPException(status_code=500, detail="Failed to send email")
-    return {"success": True, "message": "Magic link sent"}
+    # Ensure user exists or create basic record; unauthenticated, so existing users are only read
+    await db.run_sync(get_or_create_user, email=data.email, name=data.email.split('@')[0], google_id=f"magic_{data.email}")
+    await db.commit()
+    # SMTP runs after the response is sent; send_email logs its own failures
+    background_tasks.add_task(send_email, data.email, "Your Magic Login Link", html)
+    return Response(content=_MAGIC_LINK_SENT_BODY, media_type="application/json")
 
 @router.post("/verify-link")
-async def verify_magic_link(data: VerifyMagicLinkIn, db: Session = Depends(get_db)):
+async def verify_magic_link(data: VerifyMagicLinkIn, db: AsyncSession = Depends(get_async_db)):
     """Verify magic link token and issue session JWTs"""
     email = verify_magic_link_token(data.token)
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
-        # Should not happen since we create on request-link, but handle gracefully
-        user = User(name=email.split('@')[0], email=email, google_id=f"magic_{email}", role="user")
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+    # Normally created on request-link; the upsert also covers a missing row
+    user = await db.run_sync(upsert_user, email=email, name=email.split('@')[0], google_id=f"magic_{email}")
     access_token = create_access_token({"user_id": user.id, "email": user.email})
     refresh_token = create_refresh_token({"user_id": user.id})
-    user.refresh_token = refresh_token
-    db.commit()
+    user_data = {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "profile_pic": user.profile_pic,
+        "role": user.role
+    }
+    await db.commit()
     return {
         "success": True,
         "message": "Authentication successful",
         "data": {
             "access_token": access_token,
             "refresh_token": refresh_token,
-            "user": {
-                "id": user.id,
-                "name": user.name,
-                "email": user.email,
-                "profile_pic": user.profile_pic,
-                "role": user.role
-            }
+            "user": user_data
         }
     }
 
 
+# Email suffix required for Google sign-in, if the deployment restricts domains
+_GOOGLE_ALLOWED_SUFFIX = f"@{settings.GOOGLE_ALLOWED_DOMAIN}" if settings.GOOGLE_ALLOWED_DOMAIN else None
+
 # Removed legacy OAuth state storage and endpoints (/login-google, /google/callback)
 # Keep only the direct One Tap credential endpoint.
 
 @router.post("/google", summary="Direct Google Sign-In (One Tap / Credential)")
-async def google_direct_sign_in(payload: dict, db: Session = Depends(get_db)):
+async def google_direct_sign_in(
+    payload: GoogleCredentialIn,
+    http_client: httpx.AsyncClient = Depends(get_http_client)
+):
     """Accepts { credential: <google id token> } and returns access/refresh tokens."""
-    credential = payload.get("credential")
+    credential = payload.credential
     if not credential:
         raise HTTPException(status_code=400, detail="Missing Google credential")
+    if not is_well_formed_google_token(credential):
+        raise HTTPException(status_code=400, detail="Malformed credential")
     try:
-        idinfo = google_id_token.verify_oauth2_token(credential, google_requests.Request(), settings.GOOGLE_CLIENT_ID)
+        idinfo = await verify_google_id_token(credential, http_client)
     except Exception as e:
-        logger.warning(f"Google token verification failed: {e}")
+        logger.warning("Google token verification failed: %s", e)
         raise HTTPException(status_code=401, detail="Invalid Google token")
 
-    # Hardening checks
-    if idinfo.get("aud") != settings.GOOGLE_CLIENT_ID:
-        logger.warning("Google token audience mismatch")
-        raise HTTPException(status_code=401, detail="Invalid Google token audience")
-    if idinfo.get("iss") not in {"accounts.google.com", "https://accounts.google.com"}:
-        logger.warning("Google token issuer invalid")
-        raise HTTPException(status_code=401, detail="Invalid Google token issuer")
+    # Hardening checks (signature, exp, aud and iss are already enforced by verify_google_id_token)
     if not idinfo.get("email_verified"):
         logger.warning("Unverified Google account email rejected")
         raise HTTPException(status_code=401, detail="Email not verified with Google")
-    if settings.GOOGLE_ALLOWED_DOMAIN:
+    if _GOOGLE_ALLOWED_SUFFIX:
         email_val = idinfo.get("email", "") or ""
-        if not email_val.endswith(f"@{settings.GOOGLE_ALLOWED_DOMAIN}"):
+        if not email_val.endswith(_GOOGLE_ALLOWED_SUFFIX):
             logger.warning("Google account domain not allowed")
             raise HTTPException(status_code=403, detail="Email domain not allowed")
 
@@ -138,32 +142,25 @@ async def google_direct_sign_in(payload: dict, db: Session = Depends(get_db)):
     if not google_sub:
         raise HTTPException(status_code=400, detail="Invalid Google token payload")
 
-    # Upsert user
-    user = db.query(User).filter(User.google_id == google_sub).first()
-    if not user and email:
-        user = db.query(User).filter(User.email == email).first()
-    if not user:
-        user = User(
-            name=name,
+    # Upsert user; only hold a pooled connection for the SQL itself, after Google verification
+    async with AsyncSessionLocal() as db:
+        user = await db.run_sync(
+            upsert_user,
             email=email or f"user_{google_sub}@example.com",
+            name=name,
             google_id=google_sub,
-            profile_pic=picture,
-            role="user"
+            profile_pic=picture
         )
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        logger.info(f"Created new user via direct Google sign-in: {user.email}")
-    else:
-        # Ensure google_id attached
-        if not user.google_id:
-            user.google_id = google_sub
-            db.commit()
-
-    access_token = create_access_token({"user_id": user.id, "email": user.email})
-    refresh_token = create_refresh_token({"user_id": user.id})
-    user.refresh_token = refresh_token
-    db.commit()
+        access_token = create_access_token({"user_id": user.id, "email": user.email})
+        refresh_token = create_refresh_token({"user_id": user.id})
+        user_data = {
+            "id": user.id,
+            "name": user.name,
+            "email": user.email,
+            "profile_pic": user.profile_pic,
+            "role": user.role
+        }
+        await db.commit()
 
     return {
         "success": True,
@@ -171,18 +168,12 @@ async def google_direct_sign_in(payload: dict, db: Session = Depends(get_db)):
         "data": {
             "access_token": access_token,
             "refresh_token": refresh_token,
-            "user": {
-                "id": user.id,
-                "name": user.name,
-                "email": user.email,
-                "profile_pic": user.profile_pic,
-                "role": user.role
-            }
+            "user": user_data
         }
     }
 
 @router.post("/google/code", summary="Google OAuth Code Exchange (DISABLED)")
-async def google_code_exchange(payload: dict, db: Session = Depends(get_db)):
+async def google_code_exchange(payload: dict):
     """(Disabled) Previously accepted { code: <authorization_code> }.
     OAuth authorization code flow has been disabled in favor of One Tap / ID token popup only.
     """
@@ -199,28 +190,25 @@ async def me(current_user: User = Depends(get_current_user)):
 async def update_profile(
     updates: UserUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user's profile"""
     if updates.name is not None:
         current_user.name = updates.name
     if updates.profile_pic is not None:
         current_user.profile_pic = updates.profile_pic
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
     return current_user
 
 @router.post("/logout")
 async def logout(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Logout user"""
-    current_user.refresh_token = None
-    db.commit()
+    # Refresh tokens are stateless JWTs; only clear a value left over from older logins
+    if current_user.refresh_token is not None:
+        current_user.refresh_token = None
+        await db.commit()
 
-    return {
-        "success": True,
-        "message": "Successfully logged out",
-        "data": None
-    }
+    return Response(content=_LOGOUT_BODY, media_type="application/json")
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import logging
+from pydantic import BaseModel, ConfigDict, EmailStr
 
-from db.session import get_db
+from db.session import get_async_db
 from core.emailer import send_upi_qr_email
 from core.auth import get_current_user
 from models.user import User
@@ -12,22 +14,33 @@ from models.transaction import Transaction
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/email", tags=["email"])
 
-@router.post("/send-qr")
+class BuyerDetails(BaseModel):
+    """Buyer contact fields, type-checked by pydantic-core; any other keys pass through unchanged"""
+    model_config = ConfigDict(extra="allow")
+
+    name: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone: Optional[str] = None
+
+@router.post("/send-qr", status_code=status.HTTP_202_ACCEPTED)
 async def send_upi_qr(
     transaction_id: int,
-    buyer_details: Dict[str, str],
+    buyer_details: BuyerDetails,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send UPI QR code via email for INR payments"""
     
-    # Verify transaction belongs to current user and is INR payment
-    transaction = db.query(Transaction).filter(
-        Transaction.id == transaction_id,
-        Transaction.user_id == current_user.id,
-        Transaction.payment_mode == "INR",
-        Transaction.payment_status == "pending"
-    ).first()
+    # Verify transaction belongs to current user and is INR payment; the email only needs id and amount
+    transaction = (await db.execute(
+        select(Transaction.id, Transaction.amount).where(
+            Transaction.id == transaction_id,
+            Transaction.user_id == current_user.id,
+            Transaction.payment_mode == "INR",
+            Transaction.payment_status == "pending"
+        )
+    )).first()
     
     if not transaction:
         raise HTTPException(
@@ -35,33 +48,21 @@ async def send_upi_qr(
             detail="Transaction not found or not eligible for UPI payment"
         )
     
-    try:
-        # Send UPI QR email
-        email_sent = await send_upi_qr_email(
-            user_email=current_user.email,
-            user_name=current_user.name,
-            transaction=transaction,
-            buyer_details=buyer_details
-        )
-        
-        if not email_sent:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Failed to send email"
-            )
-        
-        return {
-            "success": True,
-            "message": "UPI QR code sent to your email successfully",
-            "data": {
-                "transaction_id": transaction_id,
-                "email_sent_to": current_user.email
-            }
+    # QR rendering and SMTP run after the response is sent; send_upi_qr_email logs its own failures
+    background_tasks.add_task(
+        send_upi_qr_email,
+        user_email=current_user.email,
+        user_name=current_user.name,
+        transaction=transaction,
+        buyer_details=buyer_details.model_dump(exclude_none=True)
+    )
+    
+    return {
+        "success": True,
+        "message": "UPI QR code email queued",
+        "data": {
+            "transaction_id": transaction_id,
+            "email_sent_to": current_user.email,
+            "status": "queued"
         }
-        
-    except Exception as e:
-        logger.error(f"Error sending UPI QR email: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to send UPI QR email"
-        )
+    }
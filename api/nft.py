@@ -1,22 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header
+from sqlalchemy import select, func, or_, literal_column, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
+from cachetools import TTLCache
+import asyncio
 import logging
+import re
 
-from db.session import get_db
+from db.session import get_async_db
 from models.nft import NFT
-from models.transaction import Transaction
-from schemas.nft import NFTResponse, NFTListResponse
+from models.transaction import Transaction, COMPLETED_PAYMENT_STATUSES
+from schemas.nft import NFTResponse, NFTListResponse, NFTListItem
 from core.auth import get_current_user
 from models.user import User
 
 # NEW: Supabase client helper
-from utilities.supabase_client import get_supabase
+from utilities.supabase_client import get_supabase, supabase_execute_async, SupabaseUnavailable
 
 # NEW: typed response for detail endpoint
 from schemas.nft import NFTDetailResponse
 # NEW: body model for buy endpoint
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 
 class BuyRequest(BaseModel):
     payment_mode: str | None = None
@@ -24,51 +29,131 @@ class BuyRequest(BaseModel):
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/nft", tags=["nft"])
 
+# Built once; validates ORM rows or Supabase dicts and dumps JSON-ready dicts in pydantic-core
+NFT_LIST_ADAPTER = TypeAdapter(List[NFTListItem])
+# Local list queries select these columns as plain rows: no ORM entity hydration or identity-map work
+NFT_LIST_COLUMNS = tuple(getattr(NFT, name) for name in NFTListItem.model_fields)
+# PostgREST select lists: fetch only what the response models use (skips search_tsv and any future wide columns)
+SB_LIST_COLUMNS = ",".join(NFTListItem.model_fields)
+SB_DETAIL_COLUMNS = ",".join(NFTResponse.model_fields)
+
+def _serialize_nfts(rows) -> list:
+    return NFT_LIST_ADAPTER.dump_python(NFT_LIST_ADAPTER.validate_python(rows, from_attributes=True), mode="json")
+
+# Per-process response caches for slow-changing aggregate endpoints
+_categories_cache = TTLCache(maxsize=1, ttl=300)
+_featured_cache = TTLCache(maxsize=64, ttl=120)
+_stats_cache = TTLCache(maxsize=1, ttl=3600)
+# Typeahead bursts repeat the same query; keyed by (normalized query, limit)
+_search_cache = TTLCache(maxsize=2048, ttl=30)
+# Per-(cache, key) locks for in-flight misses; dropped once the loader finishes
+_cache_locks: dict = {}
+
+async def _cached(cache: TTLCache, key, loader):
+    """Return cache[key], computing it once via loader() on a miss (concurrent misses for a key wait on its lock)"""
+    result = cache.get(key)
+    if result is None:
+        lock_key = (id(cache), key)
+        lock = _cache_locks.setdefault(lock_key, asyncio.Lock())
+        try:
+            async with lock:
+                result = cache.get(key)
+                if result is None:
+                    result = cache[key] = await loader()
+        finally:
+            # Waiters already hold the lock object; later misses start fresh
+            if _cache_locks.get(lock_key) is lock:
+                del _cache_locks[lock_key]
+    return result
+
+class _NFTBatchLoader:
+    """Coalesces concurrent Supabase NFT lookups by id into one `id IN (...)` request.
+
+    Loads queued during the same event-loop tick are dispatched together on the next tick,
+    so a lone request pays no extra delay.
+    """
+
+    def __init__(self, max_batch_size: int = 100):
+        self.max_batch_size = max_batch_size
+        self._pending = {}
+        self._scheduled = False
+        # Strong refs to running dispatch tasks (the loop only keeps weak ones)
+        self._tasks = set()
+
+    async def load(self, nft_id: int) -> Optional[dict]:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.setdefault(nft_id, []).append(fut)
+        if not self._scheduled:
+            self._scheduled = True
+            # The task first runs on the next loop iteration, after this tick's loads have queued
+            task = loop.create_task(self._dispatch())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await fut
+
+    async def _dispatch(self):
+        pending, self._pending, self._scheduled = self._pending, {}, False
+        ids = list(pending)
+        rows = {}
+        try:
+            sb = get_supabase()
+            for i in range(0, len(ids), self.max_batch_size):
+                resp = await supabase_execute_async(sb.table("nfts").select(SB_DETAIL_COLUMNS).in_("id", ids[i:i + self.max_batch_size]))
+                rows.update({r.get("id"): r for r in resp.data or []})
+        except Exception as e:
+            for futs in pending.values():
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_exception(e)
+            return
+        for nft_id, futs in pending.items():
+            for fut in futs:
+                if not fut.done():
+                    fut.set_result(rows.get(nft_id))
+
+_nft_loader = _NFTBatchLoader()
+
+_SEARCH_TOKEN_RE = re.compile(r"\w+")
+
+def _prefix_tsquery(search: str) -> str:
+    """'sun art' -> 'sun:* & art:*' (every word, prefix-matched) for search-as-you-type"""
+    return " & ".join(f"{token}:*" for token in _SEARCH_TOKEN_RE.findall(search.lower()))
+
+def clear_nft_caches():
+    """Drop cached categories/featured/stats after NFT availability changes"""
+    _categories_cache.clear()
+    _featured_cache.clear()
+    _stats_cache.clear()
+    _search_cache.clear()
+
 @router.get("/list", response_model=NFTListResponse)
 async def list_nfts(
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     category: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List available NFTs. Prefer Supabase source if configured, else fallback to local DB."""
     try:
         # Try Supabase first
         sb = get_supabase()
         if sb is not None:
-            query = sb.table("nfts").select("*").eq("is_sold", False)
+            # count="exact" returns the total in the Content-Range header of the same request
+            query = sb.table("nfts").select(SB_LIST_COLUMNS, count="exact").eq("is_sold", False)
             if category:
                 query = query.eq("category", category)
-            query = query.range(skip, skip + limit - 1)
-            sb_resp = query.execute()
+            # Newest first, id as tie-breaker so offset pages don't overlap
+            query = query.order("created_at", desc=True).order("id", desc=True).range(skip, skip + limit - 1)
+            sb_resp = await supabase_execute_async(query)
             nfts = sb_resp.data or []
 
-            # total count (separate count query)
-            count_q = sb.table("nfts").select("id", count="exact").eq("is_sold", False)
-            if category:
-                count_q = count_q.eq("category", category)
-            total = getattr(count_q.execute(), "count", None)
+            total = getattr(sb_resp, "count", None)
             if total is None:
                 total = len(nfts)
 
             # Normalize Decimal-like values to float
-            serialized = []
-            for n in nfts:
-                serialized.append({
-                    "id": n.get("id"),
-                    "title": n.get("title"),
-                    "description": n.get("description"),
-                    "image_url": n.get("image_url"),
-                    "price_inr": float(n.get("price_inr")) if n.get("price_inr") is not None else None,
-                    "price_usd": float(n.get("price_usd")) if n.get("price_usd") is not None else None,
-                    "category": n.get("category"),
-                    "is_sold": n.get("is_sold", False),
-                    "is_reserved": n.get("is_reserved", False),
-                    "reserved_at": n.get("reserved_at"),
-                    "sold_at": n.get("sold_at"),
-                    "owner_id": n.get("owner_id"),
-                    "created_at": n.get("created_at"),
-                })
+            serialized = _serialize_nfts(nfts)
 
             return {
                 "success": True,
@@ -82,33 +167,30 @@ async def list_nfts(
             }
     except Exception as e:
         # If Supabase errors, log and fall back to local DB
-        logger.warning(f"Supabase list_nfts failed, falling back to DB: {e}")
+        logger.warning("Supabase list_nfts failed, falling back to DB: %s", e)
 
     # Fallback to existing local DB implementation
     try:
-        query = db.query(NFT).filter(NFT.is_sold == False)
+        query = select(*NFT_LIST_COLUMNS).where(NFT.is_sold == False)
         if category:
-            query = query.filter(NFT.category == category)
-        total = query.count()
-        nfts = query.offset(skip).limit(limit).all()
-
-        serialized = []
-        for n in nfts:
-            serialized.append({
-                "id": n.id,
-                "title": n.title,
-                "description": n.description,
-                "image_url": n.image_url,
-                "price_inr": float(n.price_inr) if n.price_inr is not None else None,
-                "price_usd": float(n.price_usd) if n.price_usd is not None else None,
-                "category": n.category,
-                "is_sold": n.is_sold,
-                "is_reserved": n.is_reserved,
-                "reserved_at": n.reserved_at,
-                "sold_at": n.sold_at,
-                "owner_id": n.owner_id,
-                "created_at": n.created_at
-            })
+            query = query.where(NFT.category == category)
+        # Windowed count: the total rides along on every row of the page.
+        # Newest first with id as tie-breaker keeps offset pages stable (served by nfts_unsold_category)
+        rows = (await db.execute(
+            query.add_columns(func.count().over().label("total"))
+            .order_by(NFT.created_at.desc(), NFT.id.desc())
+            .offset(skip).limit(limit)
+        )).all()
+        if rows:
+            total = rows[0].total
+        elif skip:
+            # Past the last page there are no rows to carry the window count
+            total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        else:
+            total = 0
+
+        # The extra "total" column on each row is ignored by NFTListItem
+        serialized = _serialize_nfts(rows)
 
         return {
             "success": True,
@@ -121,48 +203,33 @@ async def list_nfts(
             }
         }
     except Exception as e:
-        logger.error(f"Error listing NFTs: {e}")
+        logger.error("Error listing NFTs: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve NFTs"
         )
 
-@router.get("/{nft_id}", response_model=NFTDetailResponse)
-async def get_nft(nft_id: int, db: Session = Depends(get_db)):
+@router.get("/{nft_id:int}", response_model=NFTDetailResponse)
+async def get_nft(nft_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get specific NFT details. Prefer Supabase if configured, else fallback to local DB."""
     # Try Supabase first
     try:
         sb = get_supabase()
         if sb is not None:
-            resp = sb.table("nfts").select("*").eq("id", nft_id).single().execute()
-            nft = getattr(resp, "data", None)
+            nft = await _nft_loader.load(nft_id)
             if nft:
-                # Return in wrapper format with data as ORM-like dict
+                # SB_DETAIL_COLUMNS rows carry exactly the NFTResponse fields; let the response model validate the dict
                 return {
                     "success": True,
                     "message": "NFT retrieved successfully",
-                    "data": {
-                        "id": nft.get("id"),
-                        "title": nft.get("title"),
-                        "description": nft.get("description"),
-                        "image_url": nft.get("image_url"),
-                        "price_inr": nft.get("price_inr"),
-                        "price_usd": nft.get("price_usd"),
-                        "category": nft.get("category"),
-                        "is_sold": nft.get("is_sold", False),
-                        "is_reserved": nft.get("is_reserved", False),
-                        "reserved_at": nft.get("reserved_at"),
-                        "sold_at": nft.get("sold_at"),
-                        "owner_id": nft.get("owner_id"),
-                        "created_at": nft.get("created_at"),
-                    }
+                    "data": nft
                 }
             # If not found in Supabase, fall through to local DB to preserve legacy data
     except Exception as e:
-        logger.warning(f"Supabase get_nft failed, falling back to DB: {e}")
+        logger.warning("Supabase get_nft failed, falling back to DB: %s", e)
 
     # Fallback to local DB
-    nft = db.query(NFT).filter(NFT.id == nft_id).first()
+    nft = await db.get(NFT, nft_id)
     if not nft:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -174,16 +241,18 @@ async def get_nft(nft_id: int, db: Session = Depends(get_db)):
         "data": nft
     }
 
-@router.post("/{nft_id}/buy")
+@router.post("/{nft_id:int}/buy")
 async def buy_nft(
     nft_id: int,
     payment_mode: str | None = Query(None, description="Payment mode as query: 'INR' or 'USD'"),
     payload: BuyRequest | None = None,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Initiate NFT purchase (local DB transaction tracking).
     Accepts payment_mode via query param or JSON body.
+    A repeated Idempotency-Key header returns the original purchase instead of creating another.
     """
     # Merge payment_mode from query/body
     mode = payment_mode or (payload.payment_mode if payload else None)
@@ -191,7 +260,13 @@ async def buy_nft(
         raise HTTPException(status_code=422, detail="payment_mode is required in query or body")
     mode = mode.upper()
 
-    nft = db.query(NFT).filter(NFT.id == nft_id).first()
+    if idempotency_key:
+        existing = await _find_idempotent_purchase(db, idempotency_key, current_user.id)
+        if existing:
+            return _replay_purchase(existing, nft_id, mode)
+
+    # Lock the row so concurrent buyers serialize on the is_sold/is_reserved check
+    nft = await db.scalar(select(NFT).where(NFT.id == nft_id).with_for_update())
 
     if not nft:
         # Optional: if using Supabase as source of truth and local mirror absent, we could allow purchase
@@ -233,28 +308,59 @@ async def buy_nft(
         payment_mode=mode,
         amount=amount,
         currency=currency,
-        payment_status="pending"
+        payment_status="pending",
+        idempotency_key=idempotency_key
     )
 
     db.add(transaction)
-    db.commit()
-    db.refresh(transaction)
 
-    # Reserve NFT for INR payments
+    # Reserve NFT for INR payments (same commit as the transaction insert)
     if mode == "INR":
         nft.is_reserved = True
-        nft.reserved_at = transaction.created_at
-        db.commit()
+        nft.reserved_at = func.now()
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        if not idempotency_key:
+            raise
+        # A concurrent retry with the same key committed first
+        existing = await _find_idempotent_purchase(db, idempotency_key, current_user.id)
+        if not existing:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Idempotency-Key already used"
+            )
+        return _replay_purchase(existing, nft_id, mode)
+    clear_nft_caches()
+
+    return _purchase_response(transaction)
+
+async def _find_idempotent_purchase(db: AsyncSession, key: str, user_id: int) -> Optional[Transaction]:
+    return await db.scalar(
+        select(Transaction).where(Transaction.idempotency_key == key, Transaction.user_id == user_id)
+    )
+
+def _replay_purchase(existing: Transaction, nft_id: int, mode: str) -> dict:
+    """Return the stored purchase for a repeated Idempotency-Key, rejecting reuse for a different request"""
+    if existing.nft_id != nft_id or existing.payment_mode != mode:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Idempotency-Key reused with different parameters"
+        )
+    return _purchase_response(existing)
 
+def _purchase_response(transaction: Transaction) -> dict:
+    amount = transaction.amount
     return {
         "success": True,
         "message": "Purchase initiated successfully",
         "data": {
             "transaction_id": transaction.id,
-            "payment_mode": mode,
+            "payment_mode": transaction.payment_mode,
             "amount": float(amount) if amount is not None else None,
-            "currency": currency,
-            "next_step": "complete_payment" if mode == "USD" else "await_payment_confirmation"
+            "currency": transaction.currency,
+            "next_step": "complete_payment" if transaction.payment_mode == "USD" else "await_payment_confirmation"
         }
     }
 
@@ -264,179 +370,163 @@ async def buy_nft(
 
 @router.get("/search")
 async def search_nfts(
-    search: str = Query("", min_length=1),
+    search: str = Query("", min_length=3),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Search NFTs by title/description. Supabase first, fallback to DB."""
+    search = " ".join(search.lower().split())
+    tsquery = _prefix_tsquery(search)
+    if not tsquery:
+        return {"success": True, "message": "Search results", "data": {"nfts": []}}
+    return await _cached(_search_cache, (search, limit), lambda: _load_search(search, tsquery, limit, db))
+
+async def _load_search(search: str, tsquery: str, limit: int, db: AsyncSession) -> dict:
     try:
         sb = get_supabase()
         if sb is not None:
-            # PostgREST 'or' filter with ilike on title/description
-            pattern = f"%{search}%"
-            q = sb.table("nfts").select("*").or_(f"title.ilike.{pattern},description.ilike.{pattern}")
-            q = q.eq("is_sold", False).limit(limit)
-            resp = q.execute()
+            # Full-text match on the GIN-indexed search_tsv column (see scripts/fix_schema.sql)
+            q = sb.table("nfts").select(SB_LIST_COLUMNS).eq("is_sold", False).limit(limit)
+            resp = await supabase_execute_async(q.text_search("search_tsv", tsquery, {"config": "english"}))
             rows = resp.data or []
-            items = []
-            for n in rows:
-                items.append({
-                    "id": n.get("id"),
-                    "title": n.get("title"),
-                    "description": n.get("description"),
-                    "image_url": n.get("image_url"),
-                    "price_inr": float(n.get("price_inr")) if n.get("price_inr") is not None else None,
-                    "price_usd": float(n.get("price_usd")) if n.get("price_usd") is not None else None,
-                    "category": n.get("category"),
-                    "is_sold": n.get("is_sold", False),
-                    "is_reserved": n.get("is_reserved", False),
-                    "reserved_at": n.get("reserved_at"),
-                    "sold_at": n.get("sold_at"),
-                    "owner_id": n.get("owner_id"),
-                    "created_at": n.get("created_at"),
-                })
+            items = _serialize_nfts(rows)
             return {"success": True, "message": "Search results", "data": {"nfts": items}}
     except Exception as e:
-        logger.warning(f"Supabase search_nfts failed, falling back to DB: {e}")
+        logger.warning("Supabase search_nfts failed, falling back to DB: %s", e)
 
     try:
-        # Fallback to DB search (simple ilike on title/description)
-        from sqlalchemy import or_
-        query = db.query(NFT).filter(
-            (NFT.title.ilike(f"%{search}%")) | (NFT.description.ilike(f"%{search}%"))
-        ).filter(NFT.is_sold == False).limit(limit)
-        nfts = query.all()
-        items = []
-        for n in nfts:
-            items.append({
-                "id": n.id,
-                "title": n.title,
-                "description": n.description,
-                "image_url": n.image_url,
-                "price_inr": float(n.price_inr) if n.price_inr is not None else None,
-                "price_usd": float(n.price_usd) if n.price_usd is not None else None,
-                "category": n.category,
-                "is_sold": n.is_sold,
-                "is_reserved": n.is_reserved,
-                "reserved_at": n.reserved_at,
-                "sold_at": n.sold_at,
-                "owner_id": n.owner_id,
-                "created_at": n.created_at,
-            })
+        # Fallback to DB search: FTS on Postgres, simple ilike on title/description elsewhere
+        if db.bind.dialect.name == "postgresql":
+            match = literal_column("nfts.search_tsv").op("@@")(func.to_tsquery("english", tsquery))
+        else:
+            pattern = f"%{search}%"
+            match = or_(NFT.title.ilike(pattern), NFT.description.ilike(pattern))
+        query = select(*NFT_LIST_COLUMNS).where(match).where(NFT.is_sold == False).limit(limit)
+        nfts = (await db.execute(query)).all()
+        items = _serialize_nfts(nfts)
         return {"success": True, "message": "Search results", "data": {"nfts": items}}
     except Exception as e:
-        logger.error(f"DB search_nfts failed: {e}")
+        logger.error("DB search_nfts failed: %s", e)
         raise HTTPException(status_code=500, detail="Search failed")
 
 @router.get("/categories")
-async def get_categories(db: Session = Depends(get_db)):
-    """Return list of available NFT categories."""
+async def get_categories(db: AsyncSession = Depends(get_async_db)):
+    """Return list of available NFT categories (cached for 5 minutes)."""
+    return await _cached(_categories_cache, (), lambda: _load_categories(db))
+
+# Loose index scan over idx_nfts_category: each step seeks the next category with min(), so the cost
+# grows with the number of distinct categories rather than rows. `> ''` also skips NULL and empty values.
+# Plain recursive CTE + min() runs unchanged on Postgres and SQLite; results come back sorted
+_CATEGORIES_LOOSE_SCAN = text("""
+    WITH RECURSIVE t(cat) AS (
+        SELECT min(category) FROM nfts WHERE category > ''
+        UNION ALL
+        SELECT (SELECT min(category) FROM nfts WHERE category > t.cat)
+        FROM t WHERE t.cat IS NOT NULL
+    )
+    SELECT cat FROM t WHERE cat IS NOT NULL
+""")
+
+async def _load_categories(db: AsyncSession) -> dict:
     try:
         sb = get_supabase()
         if sb is not None:
-            resp = sb.table("nfts").select("category", distinct=True).execute()
-            rows = resp.data or []
-            cats = [r.get("category") for r in rows if r.get("category")]
-            # Ensure unique and sorted
-            cats = sorted({c for c in cats})
+            # DISTINCT + ORDER BY run in Postgres (see nft_categories() in scripts/fix_schema.sql);
+            # PostgREST selects cannot express DISTINCT, so a plain select would ship every row
+            resp = await supabase_execute_async(sb.rpc("nft_categories"))
+            cats = [r.get("category") for r in resp.data or [] if r.get("category")]
             return {"success": True, "message": "Categories retrieved", "data": {"categories": cats}}
     except Exception as e:
-        logger.warning(f"Supabase get_categories failed, falling back to DB: {e}")
+        logger.warning("Supabase get_categories failed, falling back to DB: %s", e)
 
     try:
-        from sqlalchemy import distinct
-        rows = db.query(distinct(NFT.category)).filter(NFT.category.isnot(None)).all()
-        cats = sorted({r[0] for r in rows if r[0]})
+        cats = list(await db.scalars(_CATEGORIES_LOOSE_SCAN))
         return {"success": True, "message": "Categories retrieved", "data": {"categories": cats}}
     except Exception as e:
-        logger.error(f"DB get_categories failed: {e}")
+        logger.error("DB get_categories failed: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch categories")
 
 @router.get("/featured")
-async def get_featured(limit: int = Query(8, ge=1, le=50), db: Session = Depends(get_db)):
-    """Return featured NFTs (recent unsold)."""
+async def get_featured(limit: int = Query(8, ge=1, le=50), db: AsyncSession = Depends(get_async_db)):
+    """Return featured NFTs (recent unsold, cached for 2 minutes)."""
+    return await _cached(_featured_cache, (limit,), lambda: _load_featured(limit, db))
+
+async def _load_featured(limit: int, db: AsyncSession) -> dict:
     try:
         sb = get_supabase()
         if sb is not None:
-            resp = (
+            resp = await supabase_execute_async(
                 sb.table("nfts")
-                .select("*")
+                .select(SB_LIST_COLUMNS)
                 .eq("is_sold", False)
                 .order("created_at", desc=True)
                 .limit(limit)
-                .execute()
             )
             rows = resp.data or []
-            items = []
-            for n in rows:
-                items.append({
-                    "id": n.get("id"),
-                    "title": n.get("title"),
-                    "description": n.get("description"),
-                    "image_url": n.get("image_url"),
-                    "price_inr": float(n.get("price_inr")) if n.get("price_inr") is not None else None,
-                    "price_usd": float(n.get("price_usd")) if n.get("price_usd") is not None else None,
-                    "category": n.get("category"),
-                    "is_sold": n.get("is_sold", False),
-                    "is_reserved": n.get("is_reserved", False),
-                    "reserved_at": n.get("reserved_at"),
-                    "sold_at": n.get("sold_at"),
-                    "owner_id": n.get("owner_id"),
-                    "created_at": n.get("created_at"),
-                })
+            items = _serialize_nfts(rows)
             return {"success": True, "message": "Featured NFTs", "data": {"nfts": items}}
     except Exception as e:
-        logger.warning(f"Supabase get_featured failed, falling back to DB: {e}")
+        logger.warning("Supabase get_featured failed, falling back to DB: %s", e)
 
     try:
-        nfts = (
-            db.query(NFT)
-            .filter(NFT.is_sold == False)
+        nfts = (await db.execute(
+            select(*NFT_LIST_COLUMNS)
+            .where(NFT.is_sold == False)
             .order_by(NFT.created_at.desc())
             .limit(limit)
-            .all()
-        )
-        items = []
-        for n in nfts:
-            items.append({
-                "id": n.id,
-                "title": n.title,
-                "description": n.description,
-                "image_url": n.image_url,
-                "price_inr": float(n.price_inr) if n.price_inr is not None else None,
-                "price_usd": float(n.price_usd) if n.price_usd is not None else None,
-                "category": n.category,
-                "is_sold": n.is_sold,
-                "is_reserved": n.is_reserved,
-                "reserved_at": n.reserved_at,
-                "sold_at": n.sold_at,
-                "owner_id": n.owner_id,
-                "created_at": n.created_at,
-            })
+        )).all()
+        items = _serialize_nfts(nfts)
         return {"success": True, "message": "Featured NFTs", "data": {"nfts": items}}
     except Exception as e:
-        logger.error(f"DB get_featured failed: {e}")
+        logger.error("DB get_featured failed: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch featured")
 
 @router.get("/stats")
-async def get_stats(db: Session = Depends(get_db)):
-    """Return aggregate NFT stats."""
+async def get_stats(db: AsyncSession = Depends(get_async_db)):
+    """Return aggregate NFT stats (cached for 1 hour)."""
+    return await _cached(_stats_cache, (), lambda: _load_stats(db))
+
+async def _supabase_stats_without_rpc(sb) -> dict:
+    """Compute nft_stats() columns from three PostgREST requests issued concurrently"""
+    total_resp, sold_resp, prices_resp = await asyncio.gather(
+        supabase_execute_async(sb.table("nfts").select("id", count="exact", head=True)),
+        supabase_execute_async(sb.table("nfts").select("id", count="exact", head=True).eq("is_sold", True)),
+        supabase_execute_async(sb.table("nfts").select("price_usd,is_sold")),
+    )
+    revenue = price_sum = 0.0
+    priced = 0
+    for r in prices_resp.data or []:
+        price = r.get("price_usd")
+        if price is None:
+            continue
+        price = float(price)
+        price_sum += price
+        priced += 1
+        if r.get("is_sold"):
+            revenue += price
+    return {
+        "total": total_resp.count,
+        "sold": sold_resp.count,
+        "revenue": revenue,
+        "avg_price": price_sum / priced if priced else 0,
+    }
+
+async def _load_stats(db: AsyncSession) -> dict:
     try:
         sb = get_supabase()
         if sb is not None:
-            # totals via count
-            total_resp = sb.table("nfts").select("id", count="exact").execute()
-            total_nfts = int(getattr(total_resp, "count", 0) or 0)
-            sold_resp = sb.table("nfts").select("id", count="exact").eq("is_sold", True).execute()
-            total_sold = int(getattr(sold_resp, "count", 0) or 0)
-
-            # revenue and average client-side
-            prices_resp = sb.table("nfts").select("price_usd,is_sold").execute()
-            rows = prices_resp.data or []
-            sold_prices = [float(r.get("price_usd") or 0) for r in rows if r.get("is_sold")]
-            all_prices = [float(r.get("price_usd") or 0) for r in rows]
-            total_revenue = float(sum(sold_prices))
-            average_price = float(sum(all_prices) / len(all_prices)) if all_prices else 0.0
+            # Single RPC; aggregates computed in Postgres (see nft_stats() in scripts/fix_schema.sql)
+            try:
+                row = ((await supabase_execute_async(sb.rpc("nft_stats"))).data or [{}])[0]
+            except SupabaseUnavailable:
+                raise
+            except Exception as e:
+                logger.warning("nft_stats RPC unavailable, using table queries: %s", e)
+                row = await _supabase_stats_without_rpc(sb)
+            total_nfts = int(row.get("total") or 0)
+            total_sold = int(row.get("sold") or 0)
+            total_revenue = float(row.get("revenue") or 0)
+            average_price = float(row.get("avg_price") or 0)
             return {
                 "success": True,
                 "message": "Stats retrieved",
@@ -448,14 +538,18 @@ async def get_stats(db: Session = Depends(get_db)):
                 },
             }
     except Exception as e:
-        logger.warning(f"Supabase get_stats failed, falling back to DB: {e}")
+        logger.warning("Supabase get_stats failed, falling back to DB: %s", e)
 
     try:
-        from sqlalchemy import func
-        total_nfts = db.query(func.count(NFT.id)).scalar() or 0
-        total_sold = db.query(func.count(NFT.id)).filter(NFT.is_sold == True).scalar() or 0
-        total_revenue = db.query(func.coalesce(func.sum(NFT.price_usd), 0)).filter(NFT.is_sold == True).scalar() or 0
-        avg_price = db.query(func.coalesce(func.avg(NFT.price_usd), 0)).scalar() or 0
+        # All four aggregates in one scan
+        total_nfts, total_sold, total_revenue, avg_price = (await db.execute(
+            select(
+                func.count(NFT.id),
+                func.count(NFT.id).filter(NFT.is_sold == True),
+                func.coalesce(func.sum(NFT.price_usd).filter(NFT.is_sold == True), 0),
+                func.coalesce(func.avg(NFT.price_usd), 0),
+            )
+        )).one()
         return {
             "success": True,
             "message": "Stats retrieved",
@@ -467,48 +561,28 @@ async def get_stats(db: Session = Depends(get_db)):
             },
         }
     except Exception as e:
-        logger.error(f"DB get_stats failed: {e}")
+        logger.error("DB get_stats failed: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch stats")
 
 @router.get("/my-purchases")
-async def my_purchases(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def my_purchases(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
     """Return NFTs purchased by the current user.
     Uses local DB where transactions are recorded.
     """
     try:
-        # NFTs where user is owner
-        owned = db.query(NFT).filter(NFT.owner_id == current_user.id).all()
-        # NFTs with completed transactions by user
-        completed_statuses = ("completed", "paid", "success")
-        tx_join = (
-            db.query(NFT)
-            .join(Transaction, Transaction.nft_id == NFT.id)
-            .filter(Transaction.user_id == current_user.id)
-            .filter(Transaction.payment_status.in_(completed_statuses))
-            .all()
+        # One query: NFTs the user owns or has a completed transaction for.
+        # The IN semi-join deduplicates server-side; plain column rows leave nothing to lazy-load while serializing.
+        purchased_ids = (
+            select(Transaction.nft_id)
+            .where(Transaction.user_id == current_user.id)
+            .where(Transaction.payment_status.in_(COMPLETED_PAYMENT_STATUSES))
         )
-        # Merge unique by id
-        by_id = {}
-        for n in owned + tx_join:
-            by_id[n.id] = n
-        items = []
-        for n in by_id.values():
-            items.append({
-                "id": n.id,
-                "title": n.title,
-                "description": n.description,
-                "image_url": n.image_url,
-                "price_inr": float(n.price_inr) if n.price_inr is not None else None,
-                "price_usd": float(n.price_usd) if n.price_usd is not None else None,
-                "category": n.category,
-                "is_sold": n.is_sold,
-                "is_reserved": n.is_reserved,
-                "reserved_at": n.reserved_at,
-                "sold_at": n.sold_at,
-                "owner_id": n.owner_id,
-                "created_at": n.created_at,
-            })
+        nfts = (await db.execute(
+            select(*NFT_LIST_COLUMNS)
+            .where(or_(NFT.owner_id == current_user.id, NFT.id.in_(purchased_ids)))
+        )).all()
+        items = _serialize_nfts(nfts)
         return {"success": True, "message": "Purchases retrieved", "data": {"nfts": items}}
     except Exception as e:
-        logger.error(f"my_purchases failed: {e}")
+        logger.error("my_purchases failed: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch purchases")
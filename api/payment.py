@@ -1,26 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request, BackgroundTasks
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import hashlib
 import logging
+import time
+from decimal import Decimal, InvalidOperation
 from typing import Optional, Dict, Any
-import requests
-from urllib.parse import quote
+import httpx
+import orjson
+from cachetools import TTLCache
 
-from db.session import get_db, SessionLocal
+from db.session import get_async_db, AsyncSessionLocal
 from models.transaction import Transaction
 from models.nft import NFT
-from core.payment import process_paypal_payment, verify_paypal_webhook
+from core.payment import process_paypal_payment, verify_paypal_webhook, PAYPAL_SIGNATURE_HEADERS
 from core.auth import get_current_user
 from models.user import User
 from config.settings import settings
 from pydantic import BaseModel
-from core.emailer import generate_upi_qr_code
+from core.emailer import generate_upi_qr_code, upi_qr_path, transaction_upi_url
+from api.nft import clear_nft_caches
 from fastapi.responses import FileResponse
+from utilities.http_client import get_http_client
+from utilities.redis_client import get_redis
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/payment", tags=["payment"])
 
-# In-memory store for captured order IDs to avoid duplicate form logs (ephemeral)
-_captured_orders: set[str] = set()
+# Capture idempotency: Redis when available (shared across workers), else this per-process TTL map
+CAPTURE_IDEMPOTENCY_TTL = 86400
+_CAPTURE_PENDING = b"__pending__"
+_captured_orders: TTLCache = TTLCache(maxsize=10000, ttl=CAPTURE_IDEMPOTENCY_TTL)
+# Atomically replace the pending marker with the final result (only if we still own the claim)
+_FINISH_CAPTURE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+end
+return nil
+"""
+# Captures currently running in this process, so concurrent replays await the same result
+_inflight_captures: Dict[str, asyncio.Future] = {}
+
+class _CaptureOwnerCancelled(Exception):
+    """The request running a coalesced capture was cancelled (e.g. client disconnect) before it finished"""
 
 # ---------------- New lightweight PayPal create/capture flow (no DB write required) ----------------
 class PayPalCreateIn(BaseModel):
@@ -41,20 +64,33 @@ logger.info("PayPal base: %s", settings.EFFECTIVE_PAYPAL_BASE)
 cid = (settings.PAYPAL_CLIENT_ID or "")
 logger.info("PayPal client id (prefix/len): %s*** (len=%d)", cid[:6], len(cid))
 
-def _get_paypal_access_token() -> str:
-    auth_url = f"{settings.EFFECTIVE_PAYPAL_BASE}/v1/oauth2/token"
-    r = requests.post(auth_url, auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET), data={"grant_type": "client_credentials"}, timeout=10)
-    if r.status_code != 200:
+# OAuth token reused until ~80% of its lifetime has elapsed (PayPal tokens live ~9h)
+_token_cache: Dict[str, Any] = {"token": None, "exp": 0.0}
+_token_lock = asyncio.Lock()
+
+async def _get_paypal_access_token(client: httpx.AsyncClient) -> str:
+    if _token_cache["token"] and time.monotonic() < _token_cache["exp"]:
+        return _token_cache["token"]
+    async with _token_lock:
+        # Another caller may have refreshed while we waited for the lock
+        if _token_cache["token"] and time.monotonic() < _token_cache["exp"]:
+            return _token_cache["token"]
+        auth_url = f"{settings.EFFECTIVE_PAYPAL_BASE}/v1/oauth2/token"
+        r = await client.post(auth_url, auth=(settings.PAYPAL_CLIENT_ID, settings.PAYPAL_CLIENT_SECRET), data={"grant_type": "client_credentials"}, timeout=10)
+        if r.status_code != 200:
 
-    # Extra diagnostics (no secrets)
-        logger.error("PayPal token error details: status=%s, body=%s", r.status_code, r.text[:500])
+        # Extra diagnostics (no secrets)
+            logger.error("PayPal token error details: status=%s, body=%s", r.status_code, r.text[:500])
 
-        logger.error("PayPal token error: %s %s", r.status_code, r.text)
-        raise HTTPException(502, "PayPal token error")
-    return r.json().get("access_token")
+            logger.error("PayPal token error: %s %s", r.status_code, r.text)
+            raise HTTPException(502, "PayPal token error")
+        data = r.json()
+        _token_cache["token"] = data.get("access_token")
+        _token_cache["exp"] = time.monotonic() + int(data.get("expires_in", 0)) * 0.8
+        return _token_cache["token"]
 
-def _paypal_create_order(amount: str, currency: str, return_url: str, cancel_url: str) -> Dict[str, Any]:
-    token = _get_paypal_access_token()
+async def _paypal_create_order(client: httpx.AsyncClient, amount: str, currency: str, return_url: str, cancel_url: str) -> Dict[str, Any]:
+    token = await _get_paypal_access_token(client)
     url = f"{settings.EFFECTIVE_PAYPAL_BASE}/v2/checkout/orders"
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
     payload = {
@@ -62,56 +98,170 @@ def _paypal_create_order(amount: str, currency: str, return_url: str, cancel_url
         "purchase_units": [{"amount": {"currency_code": currency, "value": amount}}],
         "application_context": {"return_url": return_url, "cancel_url": cancel_url}
     }
-    r = requests.post(url, headers=headers, json=payload, timeout=15)
+    r = await client.post(url, headers=headers, json=payload, timeout=15)
     if r.status_code not in (200, 201):
         logger.error("PayPal create failed: %s %s", r.status_code, r.text)
         raise HTTPException(502, "PayPal create order failed")
     return r.json()
 
-def _paypal_capture_order(order_id: str) -> Dict[str, Any]:
-    token = _get_paypal_access_token()
+async def _paypal_capture_order(client: httpx.AsyncClient, order_id: str) -> Dict[str, Any]:
+    token = await _get_paypal_access_token(client)
     url = f"{settings.EFFECTIVE_PAYPAL_BASE}/v2/checkout/orders/{order_id}/capture"
     headers = {"Content-Type": "application/json", "Authorization": f"Bearer {token}"}
-    r = requests.post(url, headers=headers, timeout=15)
+    r = await client.post(url, headers=headers, timeout=15)
     if r.status_code not in (200, 201):
         logger.error("PayPal capture failed: %s %s", r.status_code, r.text)
         raise HTTPException(502, "PayPal capture failed")
     return r.json()
 
-def _log_to_google_form(field_map: Dict[str, str]) -> bool:
-    if not settings.GOOGLE_FORM_URL:
-        return False
+# Form logging needs the URL and every entry id; resolved once instead of per capture
+_GF_ENABLED = bool(settings.GOOGLE_FORM_URL) and all([
+    settings.GF_ENTRY_NAME, settings.GF_ENTRY_EMAIL, settings.GF_ENTRY_NFT_ID, settings.GF_ENTRY_METHOD, settings.GF_ENTRY_TXN
+])
+
+async def _log_to_google_form(client: httpx.AsyncClient, field_map: Dict[str, str]) -> bool:
     try:
-        r = requests.post(settings.GOOGLE_FORM_URL, data=field_map, timeout=6)
+        r = await client.post(settings.GOOGLE_FORM_URL, data=field_map, timeout=6)
         return r.status_code in (200, 302)
     except Exception as e:
         logger.warning("Google Form logging failed: %s", e)
         return False
 
+def _capture_key(body: "PayPalCaptureIn", expected_usd: Decimal) -> str:
+    # Price is part of the key so a repriced NFT is never answered with a result checked against the old price
+    digest = hashlib.sha256(f"{body.orderID}|{body.nft_id}|{expected_usd}|{body.buyer_email}".encode()).hexdigest()
+    return f"capture:{digest}"
+
+async def _claim_capture(redis, key: str) -> Optional[Dict[str, Any]]:
+    """Claim key for a new capture; returns the stored result instead if it was already captured"""
+    if redis is not None:
+        if await redis.set(key, _CAPTURE_PENDING, nx=True, ex=CAPTURE_IDEMPOTENCY_TTL):
+            return None
+        prior = await redis.get(key)
+    else:
+        prior = _captured_orders.get(key)
+        if prior is None:
+            _captured_orders[key] = _CAPTURE_PENDING
+            return None
+    if prior == _CAPTURE_PENDING:
+        raise HTTPException(409, "Capture already in progress")
+    return orjson.loads(prior) if prior is not None else None
+
+async def _finish_capture(redis, key: str, result: Optional[Dict[str, Any]]) -> None:
+    """Store the final result for key, or release the claim (result=None) so the client can retry"""
+    if redis is not None:
+        if result is None:
+            await redis.delete(key)
+        else:
+            await redis.eval(_FINISH_CAPTURE_LUA, 1, key, _CAPTURE_PENDING, orjson.dumps(result), CAPTURE_IDEMPOTENCY_TTL)
+    elif result is None:
+        _captured_orders.pop(key, None)
+    else:
+        _captured_orders[key] = orjson.dumps(result)
+
 @router.post("/paypal/create", summary="Lightweight PayPal create order (stateless)")
-async def paypal_create_order(data: PayPalCreateIn):
-    order = _paypal_create_order(data.amount, data.currency, data.return_url, data.cancel_url)
+async def paypal_create_order(data: PayPalCreateIn, http_client: httpx.AsyncClient = Depends(get_http_client)):
+    order = await _paypal_create_order(http_client, data.amount, data.currency, data.return_url, data.cancel_url)
     links = {l.get("rel"): l.get("href") for l in order.get("links", [])}
     return {"success": True, "order": order, "approve_url": links.get("approve")}
 
 @router.post("/paypal/capture", summary="Lightweight PayPal capture order (logs to Google Form)")
-async def paypal_capture_order(body: PayPalCaptureIn):
-    if body.orderID in _captured_orders:
-        return {"success": True, "duplicate": True}
-    result = _paypal_capture_order(body.orderID)
+async def paypal_capture_order(
+    body: PayPalCaptureIn,
+    background_tasks: BackgroundTasks,
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+    redis=Depends(get_redis),
+):
+    # Server-side price for the amount check; the pooled connection is released before calling PayPal
+    async with AsyncSessionLocal() as db:
+        expected_usd = await db.scalar(select(NFT.price_usd).where(NFT.id == body.nft_id))
+    if expected_usd is None:
+        raise HTTPException(404, "NFT not found")
+    key = _capture_key(body, expected_usd)
+    inflight = _inflight_captures.get(key)
+    if inflight is not None:
+        try:
+            return dict(await asyncio.shield(inflight), duplicate=True)
+        except _CaptureOwnerCancelled:
+            # The owner's claim is already finished or released; the stored marker decides this request
+            return await _capture_once(http_client, redis, key, body, expected_usd, background_tasks)
+    # No await between the lookup above and this insert, so only one caller becomes the owner
+    future = asyncio.get_running_loop().create_future()
+    _inflight_captures[key] = future
+    try:
+        response = await _capture_once(http_client, redis, key, body, expected_usd, background_tasks)
+    except asyncio.CancelledError:
+        # Don't cancel the waiters with us: they are still connected and fall through to _capture_once
+        future.set_exception(_CaptureOwnerCancelled())
+        future.exception()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # mark retrieved; waiters (if any) still receive it
+        raise
+    else:
+        future.set_result(response)
+        return response
+    finally:
+        _inflight_captures.pop(key, None)
+
+async def _capture_once(
+    http_client: httpx.AsyncClient,
+    redis,
+    key: str,
+    body: PayPalCaptureIn,
+    expected_usd: Decimal,
+    background_tasks: BackgroundTasks,
+) -> Dict[str, Any]:
+    prior = await _claim_capture(redis, key)
+    if prior is not None:
+        return dict(prior, duplicate=True)
+    response = None
+    try:
+        response = await _capture_and_log(http_client, body, expected_usd, background_tasks)
+    finally:
+        await _finish_capture(redis, key, response)
+    return response
+
+def _capture_amount_matches(capture: Dict[str, Any], expected_usd: Decimal) -> bool:
+    amount = capture.get("amount") or {}
+    try:
+        return amount.get("currency_code") == "USD" and Decimal(str(amount.get("value"))) == expected_usd
+    except InvalidOperation:
+        return False
+
+async def _capture_and_log(
+    http_client: httpx.AsyncClient, body: PayPalCaptureIn, expected_usd: Decimal, background_tasks: BackgroundTasks
+) -> Dict[str, Any]:
+    result = await _paypal_capture_order(http_client, body.orderID)
     status_val = result.get("status")
     if status_val != "COMPLETED":
         logger.warning("Capture status not COMPLETED: %s", status_val)
         raise HTTPException(400, "Payment not completed")
     txn_id = None
+    capture: Dict[str, Any] = {}
     try:
         captures = result.get("purchase_units", [])[0].get("payments", {}).get("captures", [])
         if captures:
-            txn_id = captures[0].get("id")
+            capture = captures[0]
+            txn_id = capture.get("id")
     except Exception:
         txn_id = None
-    field_map = {}
-    if all([settings.GF_ENTRY_NAME, settings.GF_ENTRY_EMAIL, settings.GF_ENTRY_NFT_ID, settings.GF_ENTRY_METHOD, settings.GF_ENTRY_TXN]):
+    if not _capture_amount_matches(capture, expected_usd):
+        # Money moved but not for the listed price: flag for manual review instead of recording a sale
+        logger.warning(
+            "PayPal capture %s for NFT %s does not match price %s USD: %s",
+            txn_id or body.orderID, body.nft_id, expected_usd, capture.get("amount"),
+        )
+        return {
+            "success": False,
+            "suspect": True,
+            "message": "Captured amount does not match the NFT price",
+            "txn_id": txn_id,
+            "logged_to_form": False,
+            "raw": result,
+        }
+    if _GF_ENABLED:
         field_map = {
             settings.GF_ENTRY_NAME: body.buyer_name,
             settings.GF_ENTRY_EMAIL: body.buyer_email,
@@ -119,9 +269,9 @@ async def paypal_capture_order(body: PayPalCaptureIn):
             settings.GF_ENTRY_METHOD: "PAYPAL",
             settings.GF_ENTRY_TXN: txn_id or body.orderID,
         }
-    logged = _log_to_google_form(field_map) if field_map else False
-    _captured_orders.add(body.orderID)
-    return {"success": True, "txn_id": txn_id, "logged_to_form": logged, "raw": result}
+        # Submitted after the response is sent; _log_to_google_form logs its own failures
+        background_tasks.add_task(_log_to_google_form, http_client, field_map)
+    return {"success": True, "txn_id": txn_id, "logged_to_form": _GF_ENABLED, "raw": result}
 
 # ---------------- Existing transaction-based endpoints below (unchanged) ----------------
 
@@ -129,14 +279,15 @@ async def paypal_capture_order(body: PayPalCaptureIn):
 async def create_paypal_payment(
     transaction_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    http_client: httpx.AsyncClient = Depends(get_http_client)
 ):
     """Create PayPal payment (legacy transaction-based)."""
-    transaction = db.query(Transaction).filter(
+    transaction = await db.scalar(select(Transaction).where(
         Transaction.id == transaction_id,
         Transaction.user_id == current_user.id,
         Transaction.payment_status == "pending"
-    ).first()
+    ))
 
     if not transaction:
         raise HTTPException(
@@ -144,14 +295,14 @@ async def create_paypal_payment(
             detail="Transaction not found or not eligible for payment"
         )
     try:
-        payment_result = await process_paypal_payment(transaction)
+        payment_result = await process_paypal_payment(transaction, http_client)
         return {
             "success": True,
             "message": "PayPal payment created successfully",
             "data": payment_result
         }
     except Exception as e:
-        logger.error(f"PayPal payment creation error: {e}")
+        logger.error("PayPal payment creation error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create PayPal payment"
@@ -160,56 +311,81 @@ async def create_paypal_payment(
 @router.post("/paypal/webhook")
 async def paypal_webhook(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Handle PayPal webhook events"""
     try:
         body = await request.body()
-        headers = dict(request.headers)
+        headers = {name: request.headers.get(name) for name in PAYPAL_SIGNATURE_HEADERS}
         if not verify_paypal_webhook(body, headers):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid webhook signature"
             )
-        webhook_data = await request.json()
+        # Parse the bytes already read for verification instead of request.json() decoding them again
+        webhook_data = orjson.loads(body)
         event_type = webhook_data.get("event_type")
         if event_type == "PAYMENT.CAPTURE.COMPLETED":
             resource = webhook_data.get("resource", {})
             custom_id = resource.get("custom_id")
             if custom_id:
-                transaction = db.query(Transaction).filter(Transaction.id == int(custom_id)).first()
-                if transaction:
-                    transaction.payment_status = "completed"
-                    transaction.txn_ref = resource.get("id")
-                    nft = db.query(NFT).filter(NFT.id == transaction.nft_id).first()
-                    if nft:
-                        nft.is_sold = True
-                        nft.owner_id = transaction.user_id
-                        nft.sold_at = transaction.updated_at
-                    db.commit()
-                    logger.info(f"PayPal payment completed for transaction {transaction.id}")
+                transaction_id = await _complete_paypal_capture(db, int(custom_id), resource.get("id"))
+                await db.commit()
+                if transaction_id is not None:
+                    clear_nft_caches()
+                    logger.info("PayPal payment completed for transaction %s", transaction_id)
         return {"success": True, "message": "Webhook processed successfully"}
     except Exception as e:
-        logger.error(f"PayPal webhook processing error: {e}")
+        logger.error("PayPal webhook processing error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Webhook processing failed"
         )
 
+async def _complete_paypal_capture(db: AsyncSession, transaction_id: int, capture_id: Optional[str]) -> Optional[int]:
+    """Mark the transaction completed and its NFT sold; returns None if already completed or missing."""
+    # Duplicate deliveries of the same capture match no rows and are acknowledged without re-applying
+    tx_update = (
+        update(Transaction)
+        .where(Transaction.id == transaction_id, Transaction.payment_status.is_distinct_from("completed"))
+        .values(payment_status="completed", txn_ref=capture_id)
+        .returning(Transaction.id, Transaction.nft_id, Transaction.user_id, Transaction.updated_at)
+    )
+    if db.bind.dialect.name == "postgresql":
+        # One round trip: data-modifying CTE feeding the nfts update
+        t = tx_update.cte("t")
+        result = await db.execute(
+            update(NFT)
+            .where(NFT.id == t.c.nft_id)
+            .values(is_sold=True, owner_id=t.c.user_id, sold_at=t.c.updated_at)
+            .returning(t.c.id)
+        )
+        return result.scalar()
+
+    row = (await db.execute(tx_update)).first()
+    if row is None:
+        return None
+    await db.execute(
+        update(NFT)
+        .where(NFT.id == row.nft_id)
+        .values(is_sold=True, owner_id=row.user_id, sold_at=row.updated_at)
+    )
+    return row.id
+
 @router.post("/upi/confirm")
 async def confirm_upi_payment(
     transaction_id: int,
     upi_ref: str,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Confirm UPI payment (for admin verification)"""
-    transaction = db.query(Transaction).filter(
+    transaction = await db.scalar(select(Transaction).where(
         Transaction.id == transaction_id,
         Transaction.user_id == current_user.id,
         Transaction.payment_status == "pending",
         Transaction.payment_mode == "INR"
-    ).first()
+    ))
     if not transaction:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -217,7 +393,7 @@ async def confirm_upi_payment(
         )
     transaction.txn_ref = upi_ref
     transaction.payment_status = "awaiting_verification"
-    db.commit()
+    await db.commit()
     return {
         "success": True,
         "message": "UPI payment reference submitted for verification",
@@ -234,34 +410,35 @@ async def get_paypal_client_id():
     return {"client_id": cid, "environment": env}
 
 @router.get("/upi/qr/{transaction_id}", summary="Serve UPI QR code image for a transaction")
-async def get_upi_qr(transaction_id: int):
-    db = SessionLocal()
-    txn = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+async def get_upi_qr(transaction_id: int, db: AsyncSession = Depends(get_async_db)):
+    # A transaction's QR never changes: serve the saved image without touching the DB
+    qr_path = upi_qr_path(transaction_id)
+    if qr_path.exists():
+        return _upi_qr_response(qr_path, transaction_id)
+    txn = await _upi_fields(db, transaction_id)
     if not txn:
         raise HTTPException(404, "Transaction not found")
     qr_path = generate_upi_qr_code(txn)
     if not qr_path or not qr_path.exists():
         raise HTTPException(404, "QR code not found")
-    return FileResponse(str(qr_path), media_type="image/png")
+    return _upi_qr_response(qr_path, transaction_id)
+
+async def _upi_fields(db: AsyncSession, transaction_id: int):
+    """(id, amount) row for the UPI link/QR; the full Transaction row is never needed here"""
+    return (await db.execute(
+        select(Transaction.id, Transaction.amount).where(Transaction.id == transaction_id)
+    )).first()
+
+def _upi_qr_response(qr_path, transaction_id: int) -> FileResponse:
+    return FileResponse(
+        str(qr_path),
+        media_type="image/png",
+        headers={"Cache-Control": "public, max-age=31536000, immutable", "ETag": f'"upi-qr-{transaction_id}"'},
+    )
 
 @router.get("/upi/link/{transaction_id}", summary="Return UPI deep link for a transaction")
-async def get_upi_link(transaction_id: int):
-    db = SessionLocal()
-    txn = db.query(Transaction).filter(Transaction.id == transaction_id).first()
+async def get_upi_link(transaction_id: int, db: AsyncSession = Depends(get_async_db)):
+    txn = await _upi_fields(db, transaction_id)
     if not txn:
         raise HTTPException(404, "Transaction not found")
-    payee_vpa = settings.UPI_ID
-    payee_name = getattr(settings, 'UPI_PAYEE_NAME', None) or 'NFT Marketplace'
-    tr_ref = str(txn.id)
-    amount = txn.amount
-    pn_enc = quote(payee_name, safe='')
-    tn_enc = quote(f"NFT Purchase Transaction {txn.id}", safe='')
-    upi_url = (
-        f"upi://pay?pa={payee_vpa}"
-        f"&pn={pn_enc}"
-        f"&am={amount}"
-        f"&cu=INR"
-        f"&tr={tr_ref}"
-        f"&tn={tn_enc}"
-    )
-    return {"success": True, "upi_link": upi_url}
+    return {"success": True, "upi_link": transaction_upi_url(txn)}
@@ -1,19 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timezone
 import logging
 from typing import Optional
 
-from db.session import get_db
-from models.transaction import Transaction
+from db.session import get_async_db, SessionLocal
+from models.transaction import Transaction, COMPLETED_PAYMENT_STATUSES
 from models.nft import NFT
 from models.user import User
 from core.auth import get_current_user
 from core.emailer import generate_invoice_pdf, send_purchase_email_with_attachments
+from api.nft import clear_nft_caches
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/purchase", tags=["purchase"])
 
 
+def _invoice_and_email(transaction_id: int, user_email: str, user_name: str):
+    """Background task: render the invoice PDF and email it. Re-fetches the rows in its own
+    session, since the request session is closed by the time this runs"""
+    db = SessionLocal()
+    try:
+        transaction = db.scalar(
+            select(Transaction)
+            .options(joinedload(Transaction.nft), joinedload(Transaction.user))
+            .where(Transaction.id == transaction_id)
+        )
+        if not transaction or not transaction.nft:
+            logger.warning("Invoice skipped: transaction %s not found", transaction_id)
+            return
+        invoice_path = generate_invoice_pdf(transaction, transaction.nft, user_name)
+        send_purchase_email_with_attachments(user_email, user_name, transaction, transaction.nft, invoice_path)
+    except Exception as e:
+        logger.warning("Invoice/email task failed for tx %s: %s", transaction_id, e)
+    finally:
+        db.close()
+
+
 class ConfirmPayload:
     """Placeholder-like typing for request body (we keep simple)."""
     pass
@@ -23,7 +48,7 @@ async def confirm_purchase(
     transaction_id: int,
     background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Confirm a payment and complete post-purchase flow.
 
@@ -35,14 +60,20 @@ async def confirm_purchase(
     - Return JSON response quickly
     """
     try:
-        transaction = db.query(Transaction).filter(
-            Transaction.id == transaction_id,
-            Transaction.user_id == current_user.id
-        ).first()
+        # Transaction and NFT arrive in one round-trip (inner join, since FOR UPDATE cannot
+        # lock the nullable side of an outer join). Both row locks are held until commit, so a
+        # concurrent confirm (client retry or webhook) waits here and then sees the completed
+        # status instead of fulfilling twice
+        transaction = await db.scalar(
+            select(Transaction)
+            .options(joinedload(Transaction.nft, innerjoin=True))
+            .where(Transaction.id == transaction_id, Transaction.user_id == current_user.id)
+            .with_for_update()
+        )
         if not transaction:
             raise HTTPException(status_code=404, detail="Transaction not found")
 
-        if transaction.payment_status in ("completed", "paid", "success"):
+        if transaction.payment_status in COMPLETED_PAYMENT_STATUSES:
             return {"success": True, "message": "Transaction already completed"}
 
         # Simple payment verification: ensure txn_ref exists for INR or for PayPal it should be present
@@ -51,25 +82,25 @@ async def confirm_purchase(
             logger.warning("Transaction %s has no txn_ref; proceeding anyway (legacy flow)", transaction.id)
 
         # Update DB records
-        nft = db.query(NFT).filter(NFT.id == transaction.nft_id).first()
+        nft = transaction.nft
         if not nft:
             raise HTTPException(status_code=404, detail="Associated NFT not found")
 
         transaction.payment_status = "completed"
         nft.is_sold = True
         nft.owner_id = current_user.id
-        from sqlalchemy.sql import func
-        nft.sold_at = func.now()
-        db.commit()
-        db.refresh(transaction)
-        db.refresh(nft)
+        # Python-side timestamp keeps the instance loaded after commit (no refresh round-trip)
+        nft.sold_at = datetime.now(timezone.utc)
+        await db.commit()
+        clear_nft_caches()
 
-        # Background tasks: generate invoice and send email
-        try:
-            invoice_path = generate_invoice_pdf(transaction, nft, getattr(current_user, 'name', '') or current_user.email)
-            background_tasks.add_task(send_purchase_email_with_attachments, current_user.email, getattr(current_user, 'name', '') or current_user.email, transaction, nft, invoice_path)
-        except Exception as e:
-            logger.warning("Failed to schedule invoice/email tasks: %s", e)
+        # Background task: PDF rendering and SMTP both run after the response is sent
+        background_tasks.add_task(
+            _invoice_and_email,
+            transaction.id,
+            current_user.email,
+            getattr(current_user, 'name', '') or current_user.email,
+        )
 
         return {"success": True, "message": "Purchase confirmed", "data": {"transaction_id": transaction.id}}
 
@@ -18,14 +18,25 @@ class Settings(BaseSettings):
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
     SUPABASE_ANON_KEY: str = os.getenv("SUPABASE_ANON_KEY", "")
     SUPABASE_SERVICE_ROLE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+    # Per-request PostgREST timeout; slow calls fail over to the local DB instead of hanging
+    SUPABASE_TIMEOUT_SECONDS: float = float(os.getenv("SUPABASE_TIMEOUT_SECONDS", "2.0"))
+    # Run create_all and the legacy column/index repair at startup. Turn off on replicas whose
+    # schema is already applied (scripts/fix_schema.sql) to skip the catalog round-trips on boot
+    AUTO_CREATE_TABLES: bool = os.getenv("AUTO_CREATE_TABLES", "true").lower() in ("1", "true", "yes", "on")
+    # asyncpg prepared-statement cache per connection. Off by default: PgBouncer transaction pooling
+    # (Supabase pooler, port 6543) fails with "prepared statement already exists". Raise it (e.g. 1024)
+    # only on direct connections; pooler URLs are always forced to 0 in db/session.py
+    ASYNCPG_STATEMENT_CACHE_SIZE: int = int(os.getenv("ASYNCPG_STATEMENT_CACHE_SIZE", "0"))
     
     @property
     def DATABASE_URL_ASYNC(self) -> str:
-        """Get async database URL with asyncpg driver"""
+        """Get async database URL (asyncpg for Postgres, aiosqlite for SQLite)"""
         if self.DATABASE_URL.startswith("postgresql://"):
             return self.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
         elif self.DATABASE_URL.startswith("postgresql+asyncpg://"):
             return self.DATABASE_URL
+        elif self.DATABASE_URL.startswith("sqlite://"):
+            return self.DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
         return self.DATABASE_URL
     
     @property
@@ -37,6 +48,8 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    # Per-worker pool cap for the shared async client (app.state.redis)
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
     
     # Google OAuth
     GOOGLE_CLIENT_ID: str = os.getenv("GOOGLE_CLIENT_ID", "")
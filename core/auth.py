@@ -1,50 +1,55 @@
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from jwt import InvalidTokenError
 from typing import Optional
 import logging
+import time
+from types import MappingProxyType
+from cachetools import TTLCache
 
 from config.settings import settings
 from models.user import User
-from db.session import get_db
+from db.session import get_async_db
+from utilities.jwt import encode_token, decode_token
 
 logger = logging.getLogger(__name__)
 security = HTTPBearer()
 
 def create_access_token(data: dict) -> str:
     """Create JWT access token"""
-    to_encode = data.copy()
     # Shorter TTL (15 minutes) for hardened security
-    expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire, "type": "access"})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
+    return encode_token(dict(data, type="access"), 15 * 60)
 
 def create_refresh_token(data: dict) -> str:
     """Create JWT refresh token"""
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(seconds=settings.REFRESH_TOKEN_EXPIRATION)
-    to_encode.update({"exp": expire, "type": "refresh"})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
+    return encode_token(dict(data, type="refresh"), settings.REFRESH_TOKEN_EXPIRATION)
+
+# Verified claims by raw token: SPA clients resend the same bearer on every call. Only valid
+# tokens are stored, and exp is re-checked on each hit since entries can outlive the token.
+# Entries are read-only views and every caller gets its own copy, so mutating a payload can't leak
+_verified_tokens: TTLCache = TTLCache(maxsize=10000, ttl=60)
 
 def verify_token(token: str) -> dict:
     """Verify JWT token"""
+    claims = _verified_tokens.get(token)
+    if claims is not None and claims.get("exp", 0) > time.time():
+        return dict(claims)
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        return payload
-    except JWTError as e:
-        logger.error(f"JWT verification error: {e}")
+        claims = decode_token(token)
+        _verified_tokens[token] = MappingProxyType(claims)
+        return dict(claims)
+    except InvalidTokenError as e:
+        logger.error("JWT verification error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
 
-def get_current_user(
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get current authenticated user"""
     try:
@@ -57,7 +62,9 @@ def get_current_user(
                 detail="Invalid token payload"
             )
         
-        user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+        # Shares the request's AsyncSession (FastAPI caches get_async_db per request),
+        # so endpoints can modify and commit current_user directly
+        user = await db.scalar(select(User).where(User.id == user_id, User.is_active == True))
         
         if not user:
             raise HTTPException(
@@ -67,7 +74,7 @@ def get_current_user(
         
         return user
         
-    except JWTError:
+    except InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
@@ -81,21 +88,3 @@ def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
             detail="Admin access required"
         )
     return current_user
-
-def validate_env_variables():
-    """Validate required environment variables"""
-    required_vars = [
-        "GOOGLE_CLIENT_ID",
-        "GOOGLE_CLIENT_SECRET", 
-        "JWT_SECRET",
-        "SMTP_USER",
-        "SMTP_PASSWORD"
-    ]
-    
-    missing_vars = []
-    for var in required_vars:
-        if not getattr(settings, var, None):
-            missing_vars.append(var)
-    
-    if missing_vars:
-        raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
@@ -3,6 +3,7 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from pathlib import Path
+from functools import lru_cache
 import logging
 from typing import Dict
 from urllib.parse import quote
@@ -13,7 +14,7 @@ from utilities.smtp import create_smtp_client
 
 logger = logging.getLogger(__name__)
 
-async def send_upi_qr_email(
+def send_upi_qr_email(
     user_email: str,
     user_name: str,
     transaction: Transaction,
@@ -109,35 +110,42 @@ async def send_upi_qr_email(
         return False
 
 
+UPI_QR_DIR = Path(__file__).parent.parent / "images" / "upi_qr"
+
+def upi_qr_path(transaction_id: int) -> Path:
+    """Deterministic location of a transaction's QR image (written once, then reused)"""
+    return UPI_QR_DIR / f"transaction_{transaction_id}.png"
+
+@lru_cache(maxsize=10000)
+def build_upi_url(payee_vpa: str, payee_name: str, transaction_id: int, amount) -> str:
+    """UPI payment URL per NPCI spec (common fields); pure function of its inputs"""
+    # Percent-encode only fields that commonly contain spaces/special chars
+    pn_enc = quote(payee_name, safe='')
+    tn_enc = quote(f"NFT Purchase Transaction {transaction_id}", safe='')
+    # Use transaction id as unique reference for this payment
+    return (
+        f"upi://pay?pa={payee_vpa}"
+        f"&pn={pn_enc}"
+        f"&am={amount}"
+        f"&cu=INR"
+        f"&tr={transaction_id}"
+        f"&tn={tn_enc}"
+    )
+
+def transaction_upi_url(transaction: Transaction) -> str:
+    payee_name = getattr(settings, 'UPI_PAYEE_NAME', None) or 'NFT Marketplace'
+    return build_upi_url(settings.UPI_ID, payee_name, transaction.id, transaction.amount)
+
 def generate_upi_qr_code(transaction: Transaction) -> Path:
-    """Generate UPI QR code image"""
+    """Generate UPI QR code image (reuses the saved image; a transaction's amount never changes)"""
+    qr_path = upi_qr_path(transaction.id)
+    if qr_path.exists():
+        return qr_path
     try:
         import qrcode
         from PIL import Image
         
-        # Compute standard UPI parameters
-        payee_vpa = settings.UPI_ID
-        payee_name = getattr(settings, 'UPI_PAYEE_NAME', None) or 'NFT Marketplace'
-        amount = transaction.amount
-        currency = 'INR'
-        # Use transaction.id as unique reference for this QR
-        tr_ref = str(transaction.id)
-        # Optional note
-        note = f"NFT Purchase Transaction {transaction.id}"
-        
-        # Percent-encode only fields that commonly contain spaces/special chars
-        pn_enc = quote(payee_name, safe='')
-        tn_enc = quote(note, safe='')
-        
-        # UPI payment URL per NPCI spec (common fields)
-        upi_url = (
-            f"upi://pay?pa={payee_vpa}"
-            f"&pn={pn_enc}"
-            f"&am={amount}"
-            f"&cu={currency}"
-            f"&tr={tr_ref}"
-            f"&tn={tn_enc}"
-        )
+        upi_url = transaction_upi_url(transaction)
         
         # Generate QR code
         qr = qrcode.QRCode(
@@ -153,10 +161,7 @@ def generate_upi_qr_code(transaction: Transaction) -> Path:
         qr_image = qr.make_image(fill_color="black", back_color="white")
         
         # Save QR code
-        qr_dir = Path(__file__).parent.parent / "images" / "upi_qr"
-        qr_dir.mkdir(parents=True, exist_ok=True)
-        
-        qr_path = qr_dir / f"transaction_{transaction.id}.png"
+        UPI_QR_DIR.mkdir(parents=True, exist_ok=True)
         qr_image.save(qr_path)
         
         return qr_path
@@ -10,7 +10,8 @@ logger = logging.getLogger(__name__)
 def reserve_nft(nft_id: int, user_id: int, db: Session) -> bool:
     """Reserve NFT for INR payment (15 minutes)"""
     try:
-        nft = db.query(NFT).filter(NFT.id == nft_id).first()
+        # Row lock so two concurrent reservations cannot both see is_reserved == False
+        nft = db.query(NFT).filter(NFT.id == nft_id).with_for_update().first()
         
         if not nft or nft.is_sold or nft.is_reserved:
             return False
@@ -41,16 +42,14 @@ def release_expired_reservations(db: Session):
         for nft in expired_nfts:
             nft.is_reserved = False
             nft.reserved_at = None
-            
-            # Also cancel pending transactions for expired reservations
-            pending_transactions = db.query(Transaction).filter(
-                Transaction.nft_id == nft.id,
+        
+        # Also cancel pending transactions for expired reservations (one IN update, not one query per NFT)
+        if expired_nfts:
+            db.query(Transaction).filter(
+                Transaction.nft_id.in_([nft.id for nft in expired_nfts]),
                 Transaction.payment_status == "pending",
                 Transaction.created_at < expiry_time
-            ).all()
-            
-            for transaction in pending_transactions:
-                transaction.payment_status = "expired"
+            ).update({Transaction.payment_status: "expired"}, synchronize_session=False)
         
         db.commit()
         
@@ -64,7 +63,7 @@ def release_expired_reservations(db: Session):
 def mark_nft_sold(nft_id: int, user_id: int, db: Session) -> bool:
     """Mark NFT as sold to user"""
     try:
-        nft = db.query(NFT).filter(NFT.id == nft_id).first()
+        nft = db.query(NFT).filter(NFT.id == nft_id).with_for_update().first()
         
         if not nft:
             return False
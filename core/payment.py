@@ -9,11 +9,11 @@ from models.transaction import Transaction
 
 logger = logging.getLogger(__name__)
 
-async def process_paypal_payment(transaction: Transaction) -> Dict[str, Any]:
-    """Create PayPal payment for USD transactions"""
+async def process_paypal_payment(transaction: Transaction, client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Create PayPal payment for USD transactions (client: the app's shared keep-alive client)"""
     
     # Get PayPal access token
-    access_token = await get_paypal_access_token()
+    access_token = await get_paypal_access_token(client)
     
     if not access_token:
         raise HTTPException(
@@ -55,15 +55,14 @@ async def process_paypal_payment(transaction: Transaction) -> Dict[str, Any]:
         "PayPal-Request-Id": f"nft-{transaction.id}-{transaction.created_at.timestamp()}"
     }
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders",
-            json=payment_payload,
-            headers=headers
-        )
+    response = await client.post(
+        f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders",
+        json=payment_payload,
+        headers=headers
+    )
     
     if response.status_code != 201:
-        logger.error(f"PayPal payment creation failed: {response.text}")
+        logger.error("PayPal payment creation failed: %s", response.text)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create PayPal payment"
@@ -84,7 +83,7 @@ async def process_paypal_payment(transaction: Transaction) -> Dict[str, Any]:
         "status": payment_data.get("status")
     }
 
-async def get_paypal_access_token() -> str:
+async def get_paypal_access_token(client: httpx.AsyncClient) -> str:
     """Get PayPal access token"""
     try:
         auth_data = {
@@ -98,25 +97,33 @@ async def get_paypal_access_token() -> str:
             "Accept-Language": "en_US"
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.PAYPAL_BASE_URL}/v1/oauth2/token",
-                data=auth_data,
-                headers=headers,
-                auth=auth
-            )
+        response = await client.post(
+            f"{settings.PAYPAL_BASE_URL}/v1/oauth2/token",
+            data=auth_data,
+            headers=headers,
+            auth=auth
+        )
         
         if response.status_code == 200:
             data = response.json()
             return data.get("access_token")
         else:
-            logger.error(f"PayPal token request failed: {response.text}")
+            logger.error("PayPal token request failed: %s", response.text)
             return None
             
     except Exception as e:
-        logger.error(f"Error getting PayPal access token: {e}")
+        logger.error("Error getting PayPal access token: %s", e)
         return None
 
+# Headers PayPal signs webhook deliveries with (all the verifier needs)
+PAYPAL_SIGNATURE_HEADERS = (
+    "paypal-transmission-id",
+    "paypal-transmission-time",
+    "paypal-transmission-sig",
+    "paypal-cert-url",
+    "paypal-auth-algo",
+)
+
 def verify_paypal_webhook(body: bytes, headers: Dict[str, str]) -> bool:
     """Verify PayPal webhook signature"""
     # In production, implement proper webhook signature verification
@@ -7,7 +7,7 @@ from decimal import Decimal, InvalidOperation
 from typing import List, Dict, Optional
 
 from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 
 from config.settings import settings
 from db.session import SessionLocal
@@ -127,17 +127,20 @@ def _match_and_complete(db: Session, txn: Transaction, payments: List[IncomingPa
                 # Complete
                 txn.payment_status = "completed"
                 txn.txn_ref = p.ref or txn.txn_ref
-                nft = db.query(NFT).filter(NFT.id == txn.nft_id).first()
+                # nft/user were eager-loaded with the pending query; no per-transaction lookups
+                nft = txn.nft
                 if nft:
                     nft.is_sold = True
                     nft.owner_id = txn.user_id
                     nft.sold_at = datetime.now(timezone.utc)
+                # Read before commit, which expires the loaded instances
+                user_email = txn.user.email if txn.user else None
+                user_name = (txn.user.name if txn.user else None) or "Buyer"
                 db.commit()
                 # Email receipt
                 try:
-                    user = db.query(User).filter(User.id == txn.user_id).first()
-                    if user and user.email:
-                        send_payment_receipt_email(user.email, user.name or "Buyer", txn)
+                    if user_email:
+                        send_payment_receipt_email(user_email, user_name, txn)
                 except Exception as e:
                     logger.warning("Failed to send receipt email for tx %s: %s", txn.id, e)
                 logger.info("Reconciliation completed tx %s via auto-match", txn.id)
@@ -153,6 +156,7 @@ def reconciliation_tick():
         lookback = datetime.now(timezone.utc) - timedelta(minutes=settings.RECON_LOOKBACK_MINUTES)
         pending = (
             db.query(Transaction)
+            .options(joinedload(Transaction.nft), joinedload(Transaction.user))
             .filter(Transaction.payment_mode == "INR")
             .filter(Transaction.payment_status.in_(["pending", "awaiting_verification"]))
             .filter(Transaction.created_at >= lookback)
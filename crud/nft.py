@@ -1,3 +1,4 @@
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from typing import Optional, List
 import logging
@@ -7,9 +8,12 @@ from schemas.nft import NFTCreate, NFTUpdate
 
 logger = logging.getLogger(__name__)
 
-def get_nft_by_id(db: Session, nft_id: int) -> Optional[NFT]:
-    """Get NFT by ID"""
-    return db.query(NFT).filter(NFT.id == nft_id).first()
+def get_nft_by_id(db: Session, nft_id: int, for_update: bool = False) -> Optional[NFT]:
+    """Get NFT by ID (for_update=True locks the row until commit, for read-then-write callers)"""
+    query = db.query(NFT).filter(NFT.id == nft_id)
+    if for_update:
+        query = query.with_for_update()
+    return query.first()
 
 def get_available_nfts(db: Session, skip: int = 0, limit: int = 100, category: str = None) -> List[NFT]:
     """Get available NFTs (not sold)"""
@@ -49,18 +53,26 @@ def create_nft(db: Session, nft_data: NFTCreate) -> NFT:
         raise e
 
 def update_nft(db: Session, nft_id: int, nft_data: NFTUpdate) -> Optional[NFT]:
-    """Update NFT"""
+    """Update an unsold NFT; returns None if it does not exist or has already been sold"""
     try:
-        nft = get_nft_by_id(db, nft_id)
+        update_data = nft_data.model_dump(exclude_unset=True)
+        if not update_data:
+            nft = get_nft_by_id(db, nft_id)
+            return nft if nft and not nft.is_sold else None
+        
+        # Single UPDATE ... RETURNING: no prior SELECT, and the is_sold check is atomic with the write
+        nft = db.scalars(
+            update(NFT)
+            .where(NFT.id == nft_id, NFT.is_sold == False)
+            .values(**update_data)
+            .returning(NFT),
+            execution_options={"populate_existing": True},
+        ).first()
         if not nft:
+            db.rollback()
             return None
         
-        update_data = nft_data.dict(exclude_unset=True)
-        for field, value in update_data.items():
-            setattr(nft, field, value)
-        
         db.commit()
-        db.refresh(nft)
         
         logger.info(f"Updated NFT {nft_id}")
         return nft
@@ -73,7 +85,7 @@ def update_nft(db: Session, nft_id: int, nft_data: NFTUpdate) -> Optional[NFT]:
 def reserve_nft(db: Session, nft_id: int) -> bool:
     """Reserve NFT for purchase"""
     try:
-        nft = get_nft_by_id(db, nft_id)
+        nft = get_nft_by_id(db, nft_id, for_update=True)
         if not nft or nft.is_sold or nft.is_reserved:
             return False
         
@@ -91,7 +103,7 @@ def reserve_nft(db: Session, nft_id: int) -> bool:
 def mark_nft_sold(db: Session, nft_id: int, owner_id: int) -> bool:
     """Mark NFT as sold"""
     try:
-        nft = get_nft_by_id(db, nft_id)
+        nft = get_nft_by_id(db, nft_id, for_update=True)
         if not nft:
             return False
         
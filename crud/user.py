@@ -1,4 +1,7 @@
+from sqlalchemy import case, or_
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
 from typing import Optional, List
 import logging
 
@@ -9,7 +12,7 @@ logger = logging.getLogger(__name__)
 
 def get_user_by_id(db: Session, user_id: int) -> Optional[User]:
     """Get user by ID"""
-    return db.query(User).filter(User.id == user_id).first()
+    return db.query(User).filter(User.id == user_id).one_or_none()
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """Get user by email"""
@@ -31,7 +34,6 @@ def create_user(db: Session, user_data: UserCreate) -> User:
         
         db.add(db_user)
         db.commit()
-        db.refresh(db_user)
         
         logger.info(f"Created new user: {user_data.email}")
         return db_user
@@ -41,6 +43,84 @@ def create_user(db: Session, user_data: UserCreate) -> User:
         db.rollback()
         raise e
 
+# Dialects whose INSERT supports ON CONFLICT ... RETURNING
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def get_or_create_user(
+    db: Session,
+    email: str,
+    name: str,
+    google_id: str,
+    profile_pic: Optional[str] = None
+) -> User:
+    """Get the user matching google_id or email, inserting one only on a miss (read-only for existing users).
+
+    Does not commit; the caller commits once it has finished updating the row.
+    """
+    # One lookup for both keys; a google_id match wins over an email-only match
+    user = (
+        db.query(User)
+        .filter(or_(User.google_id == google_id, User.email == email))
+        .order_by(case((User.google_id == google_id, 0), else_=1))
+        .first()
+    )
+    if user:
+        return user
+    user = User(name=name, email=email, google_id=google_id, profile_pic=profile_pic, role="user")
+    db.add(user)
+    try:
+        db.flush()
+    except IntegrityError:
+        # A concurrent request inserted the same email/google_id first
+        db.rollback()
+        user = get_user_by_google_id(db, google_id) or get_user_by_email(db, email)
+        if not user:
+            raise
+    return user
+
+def upsert_user(
+    db: Session,
+    email: str,
+    name: str,
+    google_id: str,
+    profile_pic: Optional[str] = None
+) -> User:
+    """Get the user with this email, creating it if missing, in one INSERT ... ON CONFLICT round trip.
+
+    Falls back to get_or_create_user on other dialects and when users.email has no unique index.
+    Does not commit; the caller commits once it has finished updating the row.
+    """
+    insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        return get_or_create_user(db, email=email, name=name, google_id=google_id, profile_pic=profile_pic)
+
+    stmt = insert(User).values(
+        name=name,
+        email=email,
+        google_id=google_id,
+        profile_pic=profile_pic,
+        role="user"
+    )
+    # No-op update so RETURNING yields the existing row on an email conflict
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.email],
+        set_={"email": stmt.excluded.email}
+    ).returning(User)
+    try:
+        return db.scalars(stmt, execution_options={"populate_existing": True}).one()
+    except IntegrityError:
+        # google_id already belongs to an account registered under another email
+        db.rollback()
+        user = get_user_by_google_id(db, google_id)
+        if not user:
+            raise
+        return user
+    except (ProgrammingError, OperationalError) as e:
+        # Legacy users table without the unique email index (ensure_indexes only warns): no ON CONFLICT arbiter
+        logger.warning("upsert_user ON CONFLICT unavailable, using select-then-insert: %s", e.orig)
+        db.rollback()
+        return get_or_create_user(db, email=email, name=name, google_id=google_id, profile_pic=profile_pic)
+
 def update_user(db: Session, user_id: int, user_data: UserUpdate) -> Optional[User]:
     """Update user"""
     try:
@@ -53,7 +133,6 @@ def update_user(db: Session, user_id: int, user_data: UserUpdate) -> Optional[Us
             setattr(user, field, value)
         
         db.commit()
-        db.refresh(user)
         
         logger.info(f"Updated user {user_id}")
         return user
@@ -1,6 +1,6 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.engine.url import make_url
 from config.settings import settings
 from db.base import Base
@@ -16,7 +16,8 @@ except Exception:
     # Fallback to raw string
     url = settings.DATABASE_URL_SYNC  # type: ignore
 
-engine_kwargs = {"pool_pre_ping": True, "pool_recycle": 300}
+# Larger compiled-statement cache (default 500) so the ORM/Core statement variants stay cached
+engine_kwargs = {"pool_pre_ping": True, "pool_recycle": 1800, "query_cache_size": 1200}
 
 def _make_sync_engine():
     # SQLite
@@ -31,7 +32,7 @@ def _make_sync_engine():
             infos = socket.getaddrinfo(url.host, url.port or 5432, family=socket.AF_INET, type=socket.SOCK_STREAM)
             ipv4 = infos[0][4][0] if infos else None
         except Exception as e:
-            logger.warning(f"IPv4 DNS resolution failed for {url.host}: {e}")
+            logger.warning("IPv4 DNS resolution failed for %s: %s", url.host, e)
             ipv4 = None
         if ipv4:
             try:
@@ -49,35 +50,77 @@ def _make_sync_engine():
                     )
                 return create_engine(str(url), creator=_creator, **engine_kwargs)
             except Exception as e:
-                logger.warning(f"IPv4 creator connect fallback: {e}")
+                logger.warning("IPv4 creator connect fallback: %s", e)
         # Default engine
         return create_engine(str(url), **engine_kwargs)
 
     # Default
     return create_engine(str(url), **engine_kwargs)
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout waits out write locks
+    instead of failing with 'database is locked'"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
 # Sync engine for compatibility
 engine = _make_sync_engine()
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
 
-# Async engine (optional)
-try:
-    if settings.DATABASE_URL_ASYNC.startswith("postgresql+asyncpg://"):
-        async_engine = create_async_engine(
-            settings.DATABASE_URL_ASYNC,
+def _statement_cache_size(url) -> int:
+    """Prepared statements don't survive PgBouncer transaction pooling, so pooler URLs never cache them"""
+    if url.port == 6543 or str(url.query.get("pgbouncer", "")).lower() == "true":
+        return 0
+    return settings.ASYNCPG_STATEMENT_CACHE_SIZE
+
+def _make_async_engine():
+    async_url = make_url(settings.DATABASE_URL_ASYNC)
+    if async_url.drivername == "sqlite+aiosqlite":
+        return create_async_engine(async_url, echo=False, **engine_kwargs)
+    if async_url.drivername == "postgresql+asyncpg":
+        # asyncpg takes ssl=..., not libpq's sslmode query parameter
+        # Repeated queries reuse their server-side prepared statement instead of re-parsing/planning
+        cache_size = _statement_cache_size(async_url)
+        connect_args = {"statement_cache_size": cache_size}
+        # pgbouncer=true is a Prisma/libpq-style hint asyncpg would reject as an unknown connect argument
+        async_url = async_url.difference_update_query(["pgbouncer"]).update_query_dict(
+            {"prepared_statement_cache_size": str(cache_size)}
+        )
+        sslmode = async_url.query.get("sslmode")
+        if sslmode:
+            async_url = async_url.difference_update_query(["sslmode"])
+            if sslmode != "disable":
+                connect_args["ssl"] = sslmode
+        return create_async_engine(
+            async_url,
             echo=False,
-            pool_pre_ping=True,
+            pool_size=20,
+            max_overflow=0,
+            connect_args=connect_args,
+            **engine_kwargs
         )
-    else:
-        async_engine = None
+    return None
+
+# Async engine (optional)
+try:
+    async_engine = _make_async_engine()
 except Exception as e:
-    logger.warning(f"Async engine unavailable: {e}")
+    logger.warning("Async engine unavailable: %s", e)
     async_engine = None
+if async_engine is not None and async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
 
 # Create sessionmakers
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 if async_engine:
-    AsyncSessionLocal = sessionmaker(class_=AsyncSession, autocommit=False, autoflush=False, bind=async_engine)
+    # Objects stay readable after commit; lazy attribute reloads are not possible on AsyncSession
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 else:
     AsyncSessionLocal = None
 
@@ -87,7 +130,7 @@ def get_db():
     try:
         yield db
     except Exception as e:
-        logger.error(f"Database error: {e}")
+        logger.error("Database error: %s", e)
         db.rollback()
         raise
     finally:
@@ -107,7 +150,7 @@ async def get_async_db():
         try:
             yield session
         except Exception as e:
-            logger.error(f"Async database error: {e}")
+            logger.error("Async database error: %s", e)
             await session.rollback()
             raise
         finally:
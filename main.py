@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import logging
@@ -11,8 +11,11 @@ import psycopg2
 from psycopg2 import OperationalError
 
 from config.settings import settings
-from db.session import create_tables, SessionLocal, engine
+from db.session import create_tables, SessionLocal, engine, async_engine
+from db.base import Base
 from utilities.jwt import validate_env_variables
+from utilities.http_client import create_http_client
+from utilities.redis_client import create_redis_client
 from models.nft import NFT
 from sqlalchemy import inspect, text
 from fastapi.openapi.utils import get_openapi
@@ -54,6 +57,10 @@ REQUIRED_USER_COLUMNS = {
     'created_at': 'TIMESTAMPTZ DEFAULT NOW()'
 }
 
+REQUIRED_TRANSACTION_COLUMNS = {
+    'idempotency_key': 'VARCHAR(255)'
+}
+
 def ensure_nft_columns():
     """Ensure legacy/partial nfts table has all required columns (Postgres only)."""
     try:
@@ -88,6 +95,44 @@ def ensure_user_columns():
     except Exception as e:
         logger.warning(f"ensure_user_columns failed: {e}")
 
+def ensure_transaction_columns():
+    """Ensure legacy transactions table has columns added after initial deploy."""
+    try:
+        insp = inspect(engine)
+        if 'transactions' not in insp.get_table_names():
+            return
+        existing = {c['name'] for c in insp.get_columns('transactions')}
+        with engine.begin() as conn:
+            for col, ddl in REQUIRED_TRANSACTION_COLUMNS.items():
+                if col not in existing:
+                    logger.info(f"Adding missing column to transactions: {col}")
+                    conn.execute(text(f'ALTER TABLE transactions ADD COLUMN {col} {ddl}'))
+    except Exception as e:
+        logger.warning(f"ensure_transaction_columns failed: {e}")
+
+def ensure_nft_search_index():
+    """Add the generated full-text search column and its GIN index to nfts (Postgres only)."""
+    if engine.dialect.name != "postgresql":
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(text(
+                "ALTER TABLE nfts ADD COLUMN IF NOT EXISTS search_tsv tsvector "
+                "GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED"
+            ))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS idx_nfts_search_tsv ON nfts USING GIN (search_tsv)"))
+    except Exception as e:
+        logger.warning(f"ensure_nft_search_index failed: {e}")
+
+def ensure_indexes():
+    """Create model-declared indexes missing from legacy tables (create_all skips existing tables)."""
+    for table in Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            try:
+                idx.create(engine, checkfirst=True)
+            except Exception as e:
+                logger.warning(f"ensure_indexes failed for {idx.name}: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -111,13 +156,25 @@ async def lifespan(app: FastAPI):
             logger.warning(f"DB not reachable, retrying... ({i+1}/{max_attempts}) {e}")
             time.sleep(5 * (i+1))
 
-    # Create database tables
-    create_tables()
-    logger.info("Database tables created/verified")
+    if settings.AUTO_CREATE_TABLES:
+        # Create database tables
+        create_tables()
+        logger.info("Database tables created/verified")
+
+        # Repair legacy nfts table columns (mostly for Postgres migrations)
+        ensure_nft_columns()
+        ensure_user_columns()
+        ensure_transaction_columns()
+        # Login lookups and the email upsert rely on the unique users indexes
+        ensure_indexes()
+        ensure_nft_search_index()
+    else:
+        logger.info("AUTO_CREATE_TABLES disabled; skipping schema creation/repair")
 
-    # Repair legacy nfts table columns (mostly for Postgres migrations)
-    ensure_nft_columns()
-    ensure_user_columns()
+    # Shared outbound HTTP client (keep-alive pool reused across requests)
+    app.state.http_client = create_http_client()
+    # Shared Redis (cross-worker idempotency); None falls back to per-process state
+    app.state.redis = await create_redis_client()
 
     # Start reconciliation scheduler if enabled
     start_reconciliation_scheduler()
@@ -129,6 +186,11 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     shutdown_reconciliation_scheduler()
+    await app.state.http_client.aclose()
+    if app.state.redis is not None:
+        await app.state.redis.aclose()
+    if async_engine is not None:
+        await async_engine.dispose()
     logger.info("Shutting down NFT Marketplace API...")
 
 # Create FastAPI app
@@ -138,6 +200,7 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -157,7 +220,7 @@ app.add_middleware(
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     """Handle HTTP exceptions"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content={
             "success": False,
@@ -170,7 +233,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle general exceptions"""
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "success": False,
@@ -244,10 +307,17 @@ app.openapi = custom_openapi  # type: ignore
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
+    # Auto-reload only for local development; it runs a file watcher and forces a single worker
+    reload = os.getenv("ENV", "prod") == "dev"
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True,
+        reload=reload,
+        # "auto" picks uvloop/httptools when installed (see requirements.txt), else asyncio/h11
+        loop="auto",
+        http="auto",
+        # Each worker runs its own startup schema repair and reconciliation scheduler
+        workers=None if reload else int(os.getenv("WEB_CONCURRENCY", "1")),
         log_level="info"
     )
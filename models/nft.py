@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, DECIMAL
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, DECIMAL, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from db.base import Base
@@ -23,3 +23,24 @@ class NFT(Base):
     # Relationships
     owner = relationship("User", back_populates="purchased_nfts")
     transactions = relationship("Transaction", back_populates="nft")
+
+# Partial index backing GET /api/nft/featured (unsold, newest first)
+Index(
+    "nfts_unsold_recent",
+    NFT.created_at.desc(),
+    postgresql_where=NFT.is_sold == False,
+    sqlite_where=NFT.is_sold == False,
+)
+
+# Partial index backing GET /api/nft/list?category=... (unsold rows of one category, newest first)
+Index(
+    "nfts_unsold_category",
+    NFT.category,
+    NFT.created_at.desc(),
+    NFT.id.desc(),
+    postgresql_where=NFT.is_sold == False,
+    sqlite_where=NFT.is_sold == False,
+)
+
+# Distinct-category loose index scan for GET /api/nft/categories (same name as scripts/fix_schema.sql)
+Index("idx_nfts_category", NFT.category)
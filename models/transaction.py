@@ -1,8 +1,11 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, DECIMAL
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, DECIMAL, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from db.base import Base
 
+# payment_status values that count as a finished sale ("paid"/"success" come from legacy flows)
+COMPLETED_PAYMENT_STATUSES = frozenset({"completed", "paid", "success"})
+
 class Transaction(Base):
     __tablename__ = "transactions"
     
@@ -14,9 +17,21 @@ class Transaction(Base):
     txn_ref = Column(String(255), nullable=True)  # PayPal ID, UPI ref, or transaction reference
     amount = Column(DECIMAL(10, 2), nullable=False)
     currency = Column(String(10), nullable=False)  # 'INR', 'USD'
+    idempotency_key = Column(String(255), nullable=True, unique=True, index=True)  # client Idempotency-Key for buy retries
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     user = relationship("User", back_populates="transactions")
     nft = relationship("NFT", back_populates="transactions")
+
+# Covers GET /api/nft/my-purchases: filter on (user_id, payment_status), read nft_id from the index
+Index(
+    "tx_user_status",
+    Transaction.user_id,
+    Transaction.payment_status,
+    postgresql_include=["nft_id"],
+)
+
+# Per-NFT lookups (FK side of nfts.id) and expiring an NFT's pending transactions in core.nft
+Index("ix_transactions_nft_status", Transaction.nft_id, Transaction.payment_status)
@@ -5,6 +5,8 @@ from db.base import Base
 
 class User(Base):
     __tablename__ = "users"
+    # Fetch server defaults (id, created_at) in the INSERT itself instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -0,0 +1,6 @@
+from pydantic import BaseModel, ConfigDict
+
+
+class ORMModel(BaseModel):
+    """Base for response schemas read straight from ORM objects (shared config instead of per-class Config)"""
+    model_config = ConfigDict(from_attributes=True)
@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
 from decimal import Decimal
+from schemas.base import ORMModel
 
 class NFTBase(BaseModel):
     title: str
@@ -21,7 +22,7 @@ class NFTUpdate(BaseModel):
     price_usd: Optional[Decimal] = None
     category: Optional[str] = None
 
-class NFTResponse(BaseModel):
+class NFTResponse(ORMModel):
     id: int
     title: str
     description: Optional[str]
@@ -35,9 +36,22 @@ class NFTResponse(BaseModel):
     sold_at: Optional[datetime]
     owner_id: Optional[int]
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
+
+class NFTListItem(ORMModel):
+    """Flat NFT row for list endpoints; validates ORM objects and Supabase dicts alike"""
+    id: Optional[int] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_url: Optional[str] = None
+    price_inr: Optional[float] = None
+    price_usd: Optional[float] = None
+    category: Optional[str] = None
+    is_sold: Optional[bool] = False
+    is_reserved: Optional[bool] = False
+    reserved_at: Optional[datetime] = None
+    sold_at: Optional[datetime] = None
+    owner_id: Optional[int] = None
+    created_at: Optional[datetime] = None
 
 class NFTListResponse(BaseModel):
     success: bool
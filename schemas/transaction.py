@@ -2,6 +2,7 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 from decimal import Decimal
+from schemas.base import ORMModel
 
 class TransactionBase(BaseModel):
     user_id: int
@@ -17,7 +18,7 @@ class TransactionUpdate(BaseModel):
     payment_status: Optional[str] = None
     txn_ref: Optional[str] = None
 
-class TransactionResponse(BaseModel):
+class TransactionResponse(ORMModel):
     id: int
     user_id: int
     nft_id: int
@@ -28,6 +29,3 @@ class TransactionResponse(BaseModel):
     currency: str
     created_at: datetime
     updated_at: datetime
-    
-    class Config:
-        from_attributes = True
@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime
+from schemas.base import ORMModel
 
 class UserBase(BaseModel):
     name: str
@@ -14,7 +15,7 @@ class UserUpdate(BaseModel):
     name: Optional[str] = None
     profile_pic: Optional[str] = None
 
-class UserResponse(BaseModel):
+class UserResponse(ORMModel):
     id: int
     name: str
     email: str
@@ -23,9 +24,6 @@ class UserResponse(BaseModel):
     role: str
     is_active: bool
     created_at: datetime
-    
-    class Config:
-        from_attributes = True
 
 class TokenResponse(BaseModel):
     access_token: str
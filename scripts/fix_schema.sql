@@ -10,6 +10,10 @@ ALTER TABLE nfts ADD COLUMN IF NOT EXISTS description TEXT;
 -- Ensure all required columns exist
 -- Note: Run this after connecting to your PostgreSQL database
 
+-- Idempotency-Key for POST /api/nft/{id}/buy retries
+ALTER TABLE transactions ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_transactions_idempotency_key ON transactions(idempotency_key);
+
 -- Update existing NFTs with default category if needed
 UPDATE nfts SET category = 'art' WHERE category IS NULL;
 
@@ -18,6 +22,43 @@ CREATE INDEX IF NOT EXISTS idx_nfts_category ON nfts(category);
 CREATE INDEX IF NOT EXISTS idx_nfts_is_sold ON nfts(is_sold);
 CREATE INDEX IF NOT EXISTS idx_nfts_is_reserved ON nfts(is_reserved);
 CREATE INDEX IF NOT EXISTS idx_nfts_created_at ON nfts(created_at);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users(email);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_users_google_id ON users(google_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS nfts_unsold_recent ON nfts (created_at DESC) WHERE is_sold = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS nfts_unsold_category ON nfts (category, created_at DESC, id DESC) WHERE is_sold = false;
+CREATE INDEX CONCURRENTLY IF NOT EXISTS tx_user_status ON transactions (user_id, payment_status) INCLUDE (nft_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_transactions_nft_status ON transactions (nft_id, payment_status);
+DROP INDEX CONCURRENTLY IF EXISTS ix_transactions_nft_id;
+
+-- Full-text search for GET /api/nft/search
+ALTER TABLE nfts ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))) STORED;
+CREATE INDEX IF NOT EXISTS idx_nfts_search_tsv ON nfts USING GIN (search_tsv);
+
+-- Aggregate stats in one call (used by GET /api/nft/stats via PostgREST rpc)
+CREATE OR REPLACE FUNCTION nft_stats()
+RETURNS TABLE(total bigint, sold bigint, revenue numeric, avg_price numeric)
+LANGUAGE sql STABLE AS $$
+    SELECT count(*),
+           count(*) FILTER (WHERE is_sold),
+           coalesce(sum(price_usd) FILTER (WHERE is_sold), 0),
+           coalesce(avg(price_usd), 0)
+    FROM nfts
+$$;
+
+-- Distinct categories in one call (used by GET /api/nft/categories via PostgREST rpc)
+-- Loose index scan over idx_nfts_category: one index seek per distinct category, not a full scan
+CREATE OR REPLACE FUNCTION nft_categories()
+RETURNS TABLE(category text)
+LANGUAGE sql STABLE AS $$
+    WITH RECURSIVE t(cat) AS (
+        SELECT min(n.category) FROM nfts n WHERE n.category > ''
+        UNION ALL
+        SELECT (SELECT min(n.category) FROM nfts n WHERE n.category > t.cat)
+        FROM t WHERE t.cat IS NOT NULL
+    )
+    SELECT t.cat::text FROM t WHERE t.cat IS NOT NULL
+$$;
 
 -- Show current table structure
 \d nfts;
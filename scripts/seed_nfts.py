@@ -33,7 +33,7 @@ import sys, json, logging
 from decimal import Decimal
 from pathlib import Path
 from sqlalchemy.orm import Session
-from sqlalchemy import inspect, text
+from sqlalchemy import inspect, text, insert, select
 
 # Allow running from project root or backend folder
 CURRENT_DIR = Path(__file__).resolve().parent
@@ -144,26 +144,33 @@ def load_input(path: Path | None):
     return data
 
 def seed(nfts):
-    inserted = 0
     skipped = 0
+    rows = []
     with SessionLocal() as db:  # type: Session
+        # One IN lookup for every key instead of a query per item
+        key_col = getattr(NFT, UNIQUE_KEY)
+        keys = {item.get(UNIQUE_KEY) for item in nfts if item.get(UNIQUE_KEY)}
+        seen = set(db.scalars(select(key_col).where(key_col.in_(keys)))) if keys else set()
         for item in nfts:
             key_val = item.get(UNIQUE_KEY)
-            if key_val and db.query(NFT).filter(getattr(NFT, UNIQUE_KEY)==key_val).first():
+            if key_val and key_val in seen:
                 skipped += 1
                 continue
-            nft = NFT(
-                title=item["title"],
-                description=item.get("description"),
-                image_url=item["image_url"],
-                price_inr=Decimal(str(item["price_inr"])),
-                price_usd=Decimal(str(item["price_usd"])),
-                category=item.get("category")
-            )
-            db.add(nft)
-            inserted += 1
+            if key_val:
+                seen.add(key_val)
+            rows.append({
+                "title": item["title"],
+                "description": item.get("description"),
+                "image_url": item["image_url"],
+                "price_inr": Decimal(str(item["price_inr"])),
+                "price_usd": Decimal(str(item["price_usd"])),
+                "category": item.get("category"),
+            })
+        if rows:
+            # Single executemany INSERT for the whole batch
+            db.execute(insert(NFT), rows)
         db.commit()
-    logger.info("Inserted %d NFTs, skipped %d (already existed).", inserted, skipped)
+    logger.info("Inserted %d NFTs, skipped %d (already existed).", len(rows), skipped)
 
 if __name__ == "__main__":
     # Allow: python -m scripts.seed_nfts auto
@@ -0,0 +1,16 @@
+import httpx
+from fastapi import Request
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the shared outbound HTTP client (keep-alive pool, HTTP/2)"""
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        http2=True,
+        timeout=10.0,
+    )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Dependency returning the app-wide HTTP client created at startup"""
+    return request.app.state.http_client
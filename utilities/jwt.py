@@ -1,25 +1,72 @@
-from jose import jwt
-from datetime import datetime, timedelta
+import jwt
+from jwt import InvalidTokenError, InvalidAlgorithmError, InvalidSignatureError, DecodeError, ExpiredSignatureError
+from datetime import timedelta
+import base64
+import hashlib
+import hmac
+import json
+import time
 from config.settings import settings
 
+def _b64url_encode(raw: bytes) -> bytes:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=")
+
+def _b64url_decode(segment: bytes) -> bytes:
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+# Static HS256 header and a keyed HMAC prototype, built once; each token just copies the prototype
+_HS256_HEADER = _b64url_encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+_HS256_SIGNER = hmac.new(settings.JWT_SECRET.encode(), digestmod=hashlib.sha256)
+
+def encode_token(payload: dict, expires_in: int) -> str:
+    """Sign payload with an exp claim expires_in seconds from now"""
+    claims = dict(payload, exp=int(time.time()) + expires_in)
+    if settings.JWT_ALGORITHM != "HS256":
+        return jwt.encode(claims, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+    signing_input = _HS256_HEADER + b"." + _b64url_encode(json.dumps(claims, separators=(",", ":")).encode())
+    signer = _HS256_SIGNER.copy()
+    signer.update(signing_input)
+    return (signing_input + b"." + _b64url_encode(signer.digest())).decode()
+
+def decode_token(token: str) -> dict:
+    """Verify signature and expiry and return the claims; raises jwt.InvalidTokenError when invalid"""
+    if settings.JWT_ALGORITHM != "HS256":
+        return jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    try:
+        raw = token.encode()
+        signing_input, _, signature = raw.rpartition(b".")
+        header_segment, _, payload_segment = signing_input.partition(b".")
+        if json.loads(_b64url_decode(header_segment)).get("alg") != "HS256":
+            raise InvalidAlgorithmError("The specified alg value is not allowed")
+        signer = _HS256_SIGNER.copy()
+        signer.update(signing_input)
+        if not hmac.compare_digest(_b64url_encode(signer.digest()), signature):
+            raise InvalidSignatureError("Signature verification failed.")
+        claims = json.loads(_b64url_decode(payload_segment))
+    except InvalidTokenError:
+        raise
+    except Exception as e:
+        raise DecodeError(f"Malformed token: {e}")
+    if not isinstance(claims, dict):
+        raise DecodeError("Invalid payload")
+    exp = claims.get("exp")
+    if exp is not None and (not isinstance(exp, (int, float)) or exp < time.time()):
+        raise ExpiredSignatureError("Signature has expired.")
+    return claims
+
 def create_jwt_token(data: dict, expires_delta: timedelta = None) -> str:
     """Create JWT token"""
-    to_encode = data.copy()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expires_in = int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(seconds=settings.JWT_EXPIRATION)
-    
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
-    return encoded_jwt
+        expires_in = settings.JWT_EXPIRATION
+    return encode_token(data, expires_in)
 
 def verify_jwt_token(token: str) -> dict:
     """Verify JWT token"""
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        return payload
-    except jwt.JWTError:
+        return decode_token(token)
+    except InvalidTokenError:
         return None
 
 def validate_env_variables():
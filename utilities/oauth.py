@@ -1,35 +1,105 @@
+from google.auth import jwt as google_jwt
 from google.auth.transport.requests import Request
 from google.oauth2 import id_token
 from google_auth_oauthlib.flow import Flow
+from typing import Optional
+import base64
+import json
 import logging
+import re
+import time
+import httpx
 
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
 
+GOOGLE_ISSUERS = frozenset({"accounts.google.com", "https://accounts.google.com"})
+
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_CERTS_DEFAULT_MAX_AGE = 3600
+# Minimum gap between refetches triggered by an unknown kid (guards against bogus-kid spam)
+GOOGLE_CERTS_MIN_REFETCH_SECONDS = 60
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+# Google signing certs (kid -> PEM), kept until the response's Cache-Control max-age lapses
+_google_certs_cache = {"certs": {}, "fetched_at": 0.0, "expires_at": 0.0}
+
+async def _fetch_google_certs(client: httpx.AsyncClient) -> dict:
+    resp = await client.get(GOOGLE_CERTS_URL)
+    resp.raise_for_status()
+    match = _MAX_AGE_RE.search(resp.headers.get("cache-control", ""))
+    max_age = int(match.group(1)) if match else GOOGLE_CERTS_DEFAULT_MAX_AGE
+    now = time.monotonic()
+    _google_certs_cache["certs"] = resp.json()
+    _google_certs_cache["fetched_at"] = now
+    _google_certs_cache["expires_at"] = now + max_age
+    return _google_certs_cache["certs"]
+
+async def _get_google_certs(client: httpx.AsyncClient, kid: Optional[str]) -> dict:
+    """Return cached Google certs, refetching on expiry or when the kid is unknown (key rotation)."""
+    now = time.monotonic()
+    certs = _google_certs_cache["certs"]
+    expired = now >= _google_certs_cache["expires_at"]
+    rotated = kid not in certs and now - _google_certs_cache["fetched_at"] >= GOOGLE_CERTS_MIN_REFETCH_SECONDS
+    if expired or rotated:
+        certs = await _fetch_google_certs(client)
+    return certs
+
+_B64URL_SEGMENT_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+def is_well_formed_google_token(token) -> bool:
+    """Cheap shape check (three base64url segments, RS256 header with a kid) before any crypto or cert fetch"""
+    if not isinstance(token, str):
+        return False
+    parts = token.split(".")
+    if len(parts) != 3 or not all(_B64URL_SEGMENT_RE.fullmatch(part) for part in parts):
+        return False
+    try:
+        header = json.loads(base64.urlsafe_b64decode(parts[0] + "=" * (-len(parts[0]) % 4)))
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get("alg") == "RS256" and bool(header.get("kid"))
+
+async def verify_google_id_token(token: str, client: httpx.AsyncClient) -> dict:
+    """Verify a Google ID token (signature, expiry, audience, issuer) against the cached certs.
+
+    Raises ValueError (or a google.auth exception) when the token is invalid.
+    """
+    certs = await _get_google_certs(client, google_jwt.decode_header(token).get("kid"))
+    idinfo = google_jwt.decode(token, certs=certs, audience=settings.GOOGLE_CLIENT_ID)
+    if idinfo.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError("Wrong issuer.")
+    return idinfo
+
+# Reused transport for the synchronous verification path (keeps its HTTP session alive)
+_google_request = Request()
+
+# Static OAuth client config and scopes, built once at import
+_CLIENT_CONFIG = {
+    "web": {
+        "client_id": settings.GOOGLE_CLIENT_ID,
+        "client_secret": settings.GOOGLE_CLIENT_SECRET,
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "redirect_uris": [settings.GOOGLE_REDIRECT_URI]
+    }
+}
+_OAUTH_SCOPES = ("openid", "email", "profile")
+
 def create_oauth_flow():
     """Create Google OAuth flow"""
     try:
-        client_config = {
-            "web": {
-                "client_id": settings.GOOGLE_CLIENT_ID,
-                "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
-                "redirect_uris": [settings.GOOGLE_REDIRECT_URI]
-            }
-        }
-        
         flow = Flow.from_client_config(
-            client_config,
-            scopes=["openid", "email", "profile"],
+            _CLIENT_CONFIG,
+            scopes=list(_OAUTH_SCOPES),
             redirect_uri=settings.GOOGLE_REDIRECT_URI
         )
         
         return flow
         
     except Exception as e:
-        logger.error(f"Error creating OAuth flow: {e}")
+        logger.error("Error creating OAuth flow: %s", e)
         return None
 
 def verify_google_token(token: str) -> dict:
@@ -37,15 +107,15 @@ def verify_google_token(token: str) -> dict:
     try:
         idinfo = id_token.verify_oauth2_token(
             token, 
-            Request(), 
+            _google_request, 
             settings.GOOGLE_CLIENT_ID
         )
         
-        if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
+        if idinfo['iss'] not in GOOGLE_ISSUERS:
             raise ValueError('Wrong issuer.')
         
         return idinfo
         
     except Exception as e:
-        logger.error(f"Error verifying Google token: {e}")
+        logger.error("Error verifying Google token: %s", e)
         return None
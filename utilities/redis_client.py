@@ -0,0 +1,39 @@
+import logging
+from typing import Optional
+
+from fastapi import Request
+
+from config.settings import settings
+
+try:
+    import redis.asyncio as redis  # type: ignore
+except Exception:  # pragma: no cover
+    redis = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+async def create_redis_client() -> Optional["redis.Redis"]:
+    """Connect to REDIS_URL; returns None (in-process fallbacks apply) if Redis is unreachable"""
+    if redis is None or not settings.REDIS_URL:
+        return None
+    # One pool per worker shared by every request; health checks drop connections the server idled out
+    client = redis.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        health_check_interval=30,
+        socket_connect_timeout=2,
+        socket_timeout=2,
+    )
+    try:
+        await client.ping()
+    except Exception as e:
+        logger.warning("Redis unavailable at startup, using in-process fallbacks: %s", e)
+        await client.aclose()
+        return None
+    return client
+
+
+def get_redis(request: Request) -> Optional["redis.Redis"]:
+    """Dependency returning the app-wide Redis client, or None when Redis is not available"""
+    return getattr(request.app.state, "redis", None)
@@ -16,7 +16,7 @@ def create_smtp_client():
         return smtp_client
         
     except Exception as e:
-        logger.error(f"Error creating SMTP client: {e}")
+        logger.error("Error creating SMTP client: %s", e)
         raise e
 
 def send_email(
@@ -44,9 +44,9 @@ def send_email(
         smtp_client.send_message(msg)
         smtp_client.quit()
         
-        logger.info(f"Email sent successfully to {to_email}")
+        logger.info("Email sent successfully to %s", to_email)
         return True
         
     except Exception as e:
-        logger.error(f"Error sending email: {e}")
+        logger.error("Error sending email: %s", e)
         return False
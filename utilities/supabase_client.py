@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import threading
+import time
 from functools import lru_cache
 from typing import Optional
 
@@ -6,10 +9,13 @@ from config.settings import settings
 
 try:
     # supabase v2 client
-    from supabase import create_client, Client  # type: ignore
+    from supabase import create_client, Client, ClientOptions  # type: ignore
+    from postgrest.exceptions import APIError  # type: ignore
 except Exception:  # pragma: no cover
     create_client = None  # type: ignore
     Client = object  # type: ignore
+    ClientOptions = None  # type: ignore
+    APIError = ()  # type: ignore
 
 logger = logging.getLogger(__name__)
 
@@ -23,8 +29,81 @@ def get_supabase() -> Optional["Client"]:
     if not url or not key or create_client is None:
         return None
     try:
-        client: Client = create_client(url, key)  # type: ignore
+        options = ClientOptions(postgrest_client_timeout=settings.SUPABASE_TIMEOUT_SECONDS)  # type: ignore
+        client: Client = create_client(url, key, options)  # type: ignore
         return client
     except Exception as e:  # pragma: no cover
-        logger.warning(f"Failed to initialize Supabase client: {e}")
+        logger.warning("Failed to initialize Supabase client: %s", e)
         return None
+
+
+class SupabaseUnavailable(Exception):
+    """Raised instead of calling Supabase while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After `threshold` failures in a row the circuit opens and calls are refused for
+    `reset_timeout` seconds; the next call after that is let through as a trial and
+    either closes the circuit (success) or re-opens it (failure).
+    """
+
+    def __init__(self, threshold: int = 5, reset_timeout: float = 30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                # Half-open: admit one trial call, hold the rest until it reports back
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                if self._opened_at is None:
+                    logger.warning("Supabase circuit opened after %d consecutive failures", self._failures)
+                self._opened_at = time.monotonic()
+
+
+supabase_breaker = CircuitBreaker(threshold=5, reset_timeout=30.0)
+
+
+def supabase_execute(builder):
+    """Run builder.execute() through the Supabase circuit breaker.
+
+    Raises SupabaseUnavailable immediately while the circuit is open so callers drop
+    straight to their local-DB fallback. PostgREST error replies (APIError) mean the
+    service answered and do not count as failures.
+    """
+    if not supabase_breaker.allow():
+        raise SupabaseUnavailable("Supabase circuit open")
+    try:
+        resp = builder.execute()
+    except APIError:
+        supabase_breaker.record_success()
+        raise
+    except Exception:
+        supabase_breaker.record_failure()
+        raise
+    supabase_breaker.record_success()
+    return resp
+
+
+async def supabase_execute_async(builder):
+    """supabase_execute() on a worker thread, so the blocking PostgREST call does not stall the event loop"""
+    return await asyncio.to_thread(supabase_execute, builder)